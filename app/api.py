@@ -1,14 +1,25 @@
 """Main api"""
-from io import BytesIO
+import os
 import json
 
-from flask import current_app, Response, request
-from PyPDF2 import PdfReader
+from flask import current_app, Response, request, send_file, stream_with_context
 
-from app.debug import create_pdf_with_detections
-from app.helpers import extract_binary
-from app.logic import extract_elements_cv
-from app.logic.pdf_utils import extract_widgets_pdfminer
+from app.debug import get_debug_image_path, get_debug_status, start_debug_rendering
+from app.detection import detect_document, detect_pages
+from app.helpers import extract_batch_binaries, extract_binary, is_flag_set
+from app.jobs import job_store, run_batch, submit_job
+from app.logic.constants import PDF_DOCUMENT_SIZE
+from app.logic.encoder import (
+    encode_batch_result,
+    encode_detection_result,
+    encode_error_line,
+    encode_page_line,
+    encode_summary_line,
+)
+from app.logic.page_raster import PageRasterCache
+
+JSON_MIMETYPE = 'application/json'
+NDJSON_MIMETYPE = 'application/x-ndjson'
 
 
 def detect():
@@ -18,12 +29,18 @@ def detect():
     FormData: [{
         'file': <input_file.pdf>
     }]
+    Query params:
+        debug (bool): Render images with detected areas in background,
+            fetch them later with 'debug_id'
+        stream (bool): Same as 'Accept: application/x-ndjson',
+            see _stream_detection
 
     Returns:
         flask.Response
             Content-Type: application/json
             {
                 'success': bool
+                'debug_id': str (only with debug=1)
                 'result': [{
                     'name': str
                     'value': str|dict
@@ -36,37 +53,217 @@ def detect():
             }
     """
     current_app.logger.info('--- Detecting started ---')
+    debug = is_flag_set(request.args.get('debug'))
+    stream = is_flag_set(request.args.get('stream')) or (
+        request.accept_mimetypes.best_match([JSON_MIMETYPE, NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+    )
 
     binary_file = extract_binary(request)
-    bytes_file = BytesIO(binary_file)
+    current_app.logger.info('--- Binary extracting finished ---')
 
-    pdf_file = PdfReader(bytes_file)
+    if not debug and not stream:
+        # plain requests go through the result cache
+        body = detect_document(binary_file)
+        current_app.logger.info('--- Detecting finished ---')
+        return Response(
+                response=body,
+                status=200,
+                mimetype=JSON_MIMETYPE,
+            )
 
-    current_app.logger.info('--- Binary extracting finished ---')
-    cv_coordinates = False
-
-    if '/AcroForm' in pdf_file.trailer['/Root']:
-        current_app.logger.info('--- Type "pdf-forms" ---')
-        doc_pages = extract_widgets_pdfminer(bytes_file)
-        current_app.logger.info('--- PDF forms searching finished ---')
-    else:
-        current_app.logger.info('--- Type "cv" ---')
-        doc_pages = extract_elements_cv(bytes_file)
-        cv_coordinates = True
-        current_app.logger.info('--- CV searching finished ---')
+    # debug and stream need detected pages, they always run detection
+    raster_cache = PageRasterCache(binary_file, PDF_DOCUMENT_SIZE)
 
+    # debug thread takes detection rasters as pages are detected,
+    # without debug output pages are released right after detection
+    processing_method, doc_pages = detect_pages(binary_file, raster_cache, keep_rasters=debug)
+    extra = {}
+    if debug:
+        extra['debug_id'], doc_pages = start_debug_rendering(
+            doc_pages, raster_cache, current_app.logger
+        )
+
+    if stream:
+        return Response(
+            stream_with_context(_stream_detection(processing_method, doc_pages, extra)),
+            status=200,
+            mimetype=NDJSON_MIMETYPE,
+        )
+
+    doc_pages = list(doc_pages)
     current_app.logger.info('--- Detecting finished ---')
 
-    create_pdf_with_detections(doc_pages, bytes_file)
+    return Response(
+            response=encode_detection_result(doc_pages, processing_method, **extra),
+            status=200,
+            mimetype=JSON_MIMETYPE,
+        )
+
 
-    result_list = [page.fillable_elements_to_dict() for page in doc_pages]  # short version of above for loop
+def detect_batch():
+    """Detect fillable fields in many pdf documents
+    method: POST
+
+    FormData: [{
+        'files': <input_file.pdf>|<archive.zip>
+    }, ...]
+
+    Returns:
+        flask.Response
+            Content-Type: application/json
+            {
+                'success': bool
+                'results': {
+                    <file name>: detect() response body, or
+                        {'success': False, 'message': str} for failed document
+                }
+            }
+    """
+    documents = extract_batch_binaries(request)
+    current_app.logger.info(f'--- Batch of {len(documents)} documents started ---')
+
+    results = run_batch(documents, current_app.logger)
+    current_app.logger.info('--- Batch finished ---')
 
+    return Response(
+            response=encode_batch_result(results),
+            status=200,
+            mimetype=JSON_MIMETYPE,
+        )
+
+
+def _stream_detection(processing_method, doc_pages, extra):
+    """Emit one JSON line per page as soon as it is processed
+    Args:
+        extra (dict): Additional summary line keys ('debug_id')
+    Yields:
+        str: {'page_number': int, 'result': [...]} line for each page,
+            then summary line {
+                'success': bool
+                'processing_method': str
+                'pages': int
+                'debug_id': str (only with debug=1)
+            }
+            or {'success': False, 'message': str} on error
+    """
+    pages_count = 0
+    try:
+        for doc_page in doc_pages:
+            pages_count += 1
+            yield encode_page_line(doc_page)
+
+        current_app.logger.info('--- Detecting finished ---')
+        yield encode_summary_line(processing_method, pages_count, **extra)
+    except Exception as e:
+        # headers are already sent, report error in the stream
+        current_app.logger.exception('StreamDetectionError')
+        yield encode_error_line(str(e))
+
+
+def debug_status(debug_id):
+    """Get state of background debug rendering
+    method: GET
+
+    Returns:
+        flask.Response
+            Content-Type: application/json
+            {
+                'success': bool
+                'status': 'pending'|'done'|'failed'
+                'message': str
+                'pages': list<int>
+            }
+    """
     return Response(
             response=json.dumps({
                 'success': True,
-                'processing_method': 'cv' if cv_coordinates else 'pdf-form',
-                'result': result_list,
+                **get_debug_status(debug_id),
             }),
             status=200,
-            mimetype='application/json',
+            mimetype=JSON_MIMETYPE,
+        )
+
+
+def debug_image(debug_id, page_num):
+    """Get page image with detected areas
+    method: GET
+
+    Returns:
+        flask.Response
+            Content-Type: image/png
+    """
+    return send_file(os.path.abspath(get_debug_image_path(debug_id, page_num)), mimetype='image/png')
+
+
+def submit_detection_job():
+    """Queue detection of pdf document, see detect()
+    method: POST
+
+    FormData: [{
+        'file': <input_file.pdf>
+    }]
+
+    Returns:
+        flask.Response
+            Status: 202
+            Content-Type: application/json
+            {
+                'success': bool
+                'job_id': str
+                'status': 'pending'
+            }
+    """
+    binary_file = extract_binary(request)
+    job_id = submit_job(binary_file, current_app.logger)
+    current_app.logger.info(f'--- Job {job_id} submitted ---')
+
+    return Response(
+            response=json.dumps({
+                'success': True,
+                'job_id': job_id,
+                'status': 'pending',
+            }),
+            status=202,
+            mimetype=JSON_MIMETYPE,
+        )
+
+
+def detection_job_status(job_id):
+    """Get state of detection job
+    method: GET
+
+    Returns:
+        flask.Response
+            Content-Type: application/json
+            {
+                'success': bool
+                'job_id': str
+                'status': 'pending'|'done'|'failed'
+                'message': str
+            }
+    """
+    return Response(
+            response=json.dumps({
+                'success': True,
+                'job_id': job_id,
+                **job_store.get_status(job_id),
+            }),
+            status=200,
+            mimetype=JSON_MIMETYPE,
+        )
+
+
+def detection_job_result(job_id):
+    """Get result of finished detection job
+    method: GET
+
+    Returns:
+        flask.Response
+            Content-Type: application/json
+            Same as detect()
+    """
+    return Response(
+            response=job_store.get_result(job_id),
+            status=200,
+            mimetype=JSON_MIMETYPE,
         )
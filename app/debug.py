@@ -1,9 +1,37 @@
+from io import BytesIO
 import os
-import numpy as np
-from pdf2image import convert_from_bytes
+import queue
+import shutil
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
 from PIL import Image, ImageDraw, ImageFont
+from werkzeug.exceptions import NotFound
+
+from app.helpers import write_atomic
+from app.logic.constants import (
+    DEBUG_OUTPUT_DIR,
+    DEBUG_OUTPUT_TTL,
+    DEBUG_QUEUE_SIZE,
+    DEBUG_WORKERS,
+    PDF_DOCUMENT_SIZE,
+    RECTANGLES_OUTLINE_COLOR_1,
+    RECTANGLES_OUTLINE_WIDTH,
+)
+from app.logic.page_raster import PageRasterCache
+
+_DONE_MARKER = 'done'
+_FAILED_MARKER = 'failed'
+
+_executor = ThreadPoolExecutor(max_workers=DEBUG_WORKERS, thread_name_prefix='debug')
+
 
-from app.logic.constants import PDF_DOCUMENT_SIZE, RECTANGLES_OUTLINE_COLOR_1, RECTANGLES_OUTLINE_WIDTH
+@lru_cache(maxsize=None)
+def _get_font():
+    """Custom font style and font size, loaded once per process"""
+    return ImageFont.truetype('Roboto-Regular.ttf', size=30)
 
 
 def draw_founded_areas(image, fillable_element):
@@ -23,8 +51,6 @@ def draw_founded_areas(image, fillable_element):
         outline=RECTANGLES_OUTLINE_COLOR_1,
         width=RECTANGLES_OUTLINE_WIDTH
     )
-    # Custom font style and font size
-    roboto_font = ImageFont.truetype('Roboto-Regular.ttf', size=30)
     obj_type = 'c' if fillable_element['obj_type'].lower() == 'checkbox' else fillable_element['obj_type']
     debug_text = f"{obj_type}, {fillable_element['name']}" if fillable_element['name'] and fillable_element['obj_type'].lower() != 'checkbox' else f"{obj_type}"
     draw.text((
@@ -32,22 +58,172 @@ def draw_founded_areas(image, fillable_element):
         fillable_element['y1']+5),
         debug_text,
         'red',
-        font=roboto_font
+        font=_get_font()
     )
 
 
-def create_pdf_with_detections(doc_pages, pdf_binary):
-    # delete old debug images
-    for file in os.listdir('output'):
-        if file.startswith('processed'):
-            os.remove(os.path.join('output', file))
-    page_bytes = pdf_binary.getvalue()
-    page_images = convert_from_bytes(page_bytes, PDF_DOCUMENT_SIZE)
+def create_pdf_with_detections(doc_pages, pdf_binary, output_dir=DEBUG_OUTPUT_DIR):
+    """Save debug images of all pages synchronously
+    Args:
+        doc_pages (list<logic.classes.DocumentPage>)
+        pdf_binary (io.BytesIO)
+        output_dir (str): Directory for processed<page_num>.png images
+    """
+    raster_cache = PageRasterCache(pdf_binary.getvalue(), PDF_DOCUMENT_SIZE)
+    for _ in iter_pages_with_detections(doc_pages, raster_cache, output_dir):
+        pass
+
+
+def iter_pages_with_detections(doc_pages, raster_cache, output_dir=DEBUG_OUTPUT_DIR):
+    """Save debug image for each page and pass the page through
+    Page raster is released right after saving, so this can wrap
+    a lazy page iterator without holding all rendered pages.
+    Args:
+        doc_pages (iterable<logic.classes.DocumentPage>)
+        raster_cache (logic.page_raster.PageRasterCache)
+        output_dir (str): Directory for processed<page_num>.png images
+    Yields:
+        logic.classes.DocumentPage
+    """
     for doc_page in doc_pages:
-        page_image_converted = page_images[doc_page.page_num]
-        cv_image = np.array(page_image_converted)
-        image = Image.fromarray(cv_image)
-        for fillable_element in doc_page.fillable_elements_to_dict():
-            draw_founded_areas(image, fillable_element)
+        _save_debug_image(doc_page, raster_cache.get(doc_page.page_num), output_dir)
+        raster_cache.release(doc_page.page_num)
+        yield doc_page
+
+
+def _save_debug_image(doc_page, page_image, output_dir):
+    # single copy from gray page raster, detections are drawn in color
+    image = Image.fromarray(page_image).convert('RGB')
+    for fillable_element in doc_page.fillable_elements_to_dict():
+        draw_founded_areas(image, fillable_element)
+
+    image_file = BytesIO()
+    image.save(image_file, format='PNG')
+    write_atomic(os.path.join(output_dir, f'processed{doc_page.page_num}.png'), image_file.getvalue())
+
+
+def start_debug_rendering(doc_pages, raster_cache, logger):
+    """Render debug images in background thread while pages are detected
+    Each detected page is handed over to the thread with its detection
+    raster, so pages are rendered once per request. Detection has to
+    keep rasters in raster_cache (keep_rasters), they are taken out of it
+    here. At most DEBUG_QUEUE_SIZE pages wait for drawing, detection
+    waits for the thread when it is behind. Each call gets its own output
+    directory, so concurrent requests never touch each other's images.
+    Args:
+        doc_pages (iterable<logic.classes.DocumentPage>)
+        raster_cache (logic.page_raster.PageRasterCache)
+        logger (logging.Logger)
+    Returns:
+        tuple<str, iterable<logic.classes.DocumentPage>>: debug_id for
+            get_debug_status and get_debug_image_path, and doc_pages
+            to consume instead of the original ones
+    """
+    _evict_expired_debug_output()
+    debug_id = uuid.uuid4().hex
+    output_dir = os.path.join(DEBUG_OUTPUT_DIR, debug_id)
+    os.makedirs(output_dir)
+    pages = queue.Queue(maxsize=DEBUG_QUEUE_SIZE)
+    _executor.submit(_render_debug_output, pages, raster_cache.pdf_bytes, output_dir, logger)
+    return debug_id, _hand_over_pages(doc_pages, raster_cache, pages)
+
+
+def _hand_over_pages(doc_pages, raster_cache, pages):
+    try:
+        for doc_page in doc_pages:
+            # pages not rendered by detection (e.g. widget pages) are None
+            pages.put((doc_page, raster_cache.pop(doc_page.page_num)))
+            yield doc_page
+    finally:
+        pages.put(None)
+
+
+def _render_debug_output(pages, pdf_bytes, output_dir, logger):
+    # pages which detection didn't render
+    raster_cache = PageRasterCache(pdf_bytes, PDF_DOCUMENT_SIZE)
+    marker, message = _DONE_MARKER, ''
+    for doc_page, page_image in iter(pages.get, None):
+        if marker == _FAILED_MARKER:
+            # keep taking pages, so detection isn't blocked
+            continue
+        try:
+            if page_image is None:
+                page_image = raster_cache.get(doc_page.page_num)
+                raster_cache.release(doc_page.page_num)
+            _save_debug_image(doc_page, page_image, output_dir)
+        except Exception as e:
+            logger.exception('DebugRenderingError')
+            marker, message = _FAILED_MARKER, str(e)
+    with open(os.path.join(output_dir, marker), 'w') as f:
+        f.write(message)
+
+
+def _get_debug_dir(debug_id):
+    """
+    Raises:
+        werkzeug.exceptions.NotFound: when debug_id is unknown
+    """
+    try:
+        debug_id = uuid.UUID(hex=debug_id).hex
+    except ValueError as e:
+        raise NotFound('Debug output not found') from e
+    output_dir = os.path.join(DEBUG_OUTPUT_DIR, debug_id)
+    if not os.path.isdir(output_dir):
+        raise NotFound('Debug output not found')
+    return output_dir
+
+
+def get_debug_status(debug_id):
+    """Get state of background debug rendering
+    Args:
+        debug_id (str)
+    Returns:
+        dict {
+            'status': 'pending'|'done'|'failed'
+            'message': str
+            'pages': list<int>
+        }
+    Raises:
+        werkzeug.exceptions.NotFound: when debug_id is unknown
+    """
+    output_dir = _get_debug_dir(debug_id)
+    files = os.listdir(output_dir)
+    status, message = 'pending', ''
+    for marker in (_DONE_MARKER, _FAILED_MARKER):
+        if marker in files:
+            status = marker
+            with open(os.path.join(output_dir, marker)) as f:
+                message = f.read()
+    pages = sorted(
+        int(file[len('processed'):-len('.png')])
+        for file in files if file.startswith('processed') and file.endswith('.png')
+    )
+    return {
+        'status': status,
+        'message': message,
+        'pages': pages,
+    }
+
+
+def get_debug_image_path(debug_id, page_num):
+    """
+    Args:
+        debug_id (str)
+        page_num (int)
+    Returns:
+        str: Path to the processed page image
+    Raises:
+        werkzeug.exceptions.NotFound: when image doesn't exist (yet)
+    """
+    path = os.path.join(_get_debug_dir(debug_id), f'processed{page_num}.png')
+    if not os.path.isfile(path):
+        raise NotFound('Debug image not found')
+    return path
+
 
-        image.save(f'output/processed{doc_page.page_num}.png')
+def _evict_expired_debug_output():
+    """Delete per-request debug directories older than DEBUG_OUTPUT_TTL"""
+    expire_before = time.time() - DEBUG_OUTPUT_TTL
+    for entry in os.scandir(DEBUG_OUTPUT_DIR):
+        if entry.is_dir() and len(entry.name) == 32 and entry.stat().st_mtime < expire_before:
+            shutil.rmtree(entry.path, ignore_errors=True)
@@ -0,0 +1,70 @@
+"""Detection entry points shared by sync api, jobs and batches"""
+import heapq
+
+from flask import current_app
+
+from app.logic import iter_elements_cv
+from app.logic.constants import HYBRID_DETECTION, PDF_DOCUMENT_SIZE
+from app.logic.encoder import encode_detection_result
+from app.logic.page_raster import PageRasterCache
+from app.logic.pdf_source import PdfSource
+from app.logic.pdf_utils import extract_widgets_pdfminer
+from app.result_cache import result_cache, result_cache_key
+
+
+def detect_pages(binary_file, raster_cache, keep_rasters=False):
+    """Choose detection method for each page of the document
+    Pages with form widgets take them as is, other pages go through CV.
+    Document is parsed once, the parse is shared by the check and
+    the extractors.
+    Args:
+        binary_file (bytes): Pdf document
+        raster_cache (logic.page_raster.PageRasterCache)
+        keep_rasters (bool): Leave CV rendered pages in raster_cache,
+            the consumer is responsible for releasing them
+    Returns:
+        tuple<str, iterable<logic.classes.DocumentPage>>:
+            processing method ('pdf-form'|'cv'|'hybrid') and lazily
+            detected pages in page order
+    """
+    source = PdfSource(binary_file)
+
+    if not source.has_acroform:
+        current_app.logger.info('--- Type "cv" ---')
+        return 'cv', iter_elements_cv(source, raster_cache, keep_rasters=keep_rasters)
+
+    widget_pages = extract_widgets_pdfminer(source)
+    widget_page_nums = {doc_page.page_num for doc_page in widget_pages}
+    cv_page_nums = [
+        page_num for page_num in range(len(source.page_ids))
+        if page_num not in widget_page_nums
+    ]
+    if not HYBRID_DETECTION or not cv_page_nums:
+        current_app.logger.info('--- Type "pdf-forms" ---')
+        return 'pdf-form', widget_pages
+
+    current_app.logger.info(f'--- Type "hybrid", {len(cv_page_nums)} pages without widgets ---')
+    cv_pages = iter_elements_cv(
+        source, raster_cache, keep_rasters=keep_rasters, page_nums=cv_page_nums
+    )
+    return 'hybrid', heapq.merge(widget_pages, cv_pages, key=lambda doc_page: doc_page.page_num)
+
+
+def detect_document(binary_file):
+    """Run full detection of the document, or take its cached result
+    Args:
+        binary_file (bytes): Pdf document
+    Returns:
+        str: JSON body of detect() response
+    """
+    cache_key = result_cache_key(binary_file)
+    body = result_cache.get(cache_key)
+    if body is not None:
+        current_app.logger.info('--- Result cache hit ---')
+        return body
+
+    raster_cache = PageRasterCache(binary_file, PDF_DOCUMENT_SIZE)
+    processing_method, doc_pages = detect_pages(binary_file, raster_cache)
+    body = encode_detection_result(doc_pages, processing_method)
+    result_cache.put(cache_key, body)
+    return body
@@ -1,8 +1,26 @@
 """Root Exceptions"""
-from werkzeug.exceptions import BadRequest
+from werkzeug.exceptions import BadRequest, Conflict, NotFound, ServiceUnavailable
 
 
 class FileNotFound(BadRequest):
     """When file not found in request"""
     def __init__(self):
         super().__init__("File not found")
+
+
+class JobNotFound(NotFound):
+    """When job is unknown or its result is already evicted"""
+    def __init__(self):
+        super().__init__("Job not found")
+
+
+class JobNotFinished(Conflict):
+    """When job result is requested before job is done"""
+    def __init__(self):
+        super().__init__("Job is not finished")
+
+
+class JobQueueFull(ServiceUnavailable):
+    """When there are too many queued jobs"""
+    def __init__(self):
+        super().__init__("Job queue is full, try again later")
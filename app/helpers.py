@@ -1,7 +1,13 @@
 """Root helpers functions"""
+from io import BytesIO
+import os
+import threading
+import zipfile
+
 from werkzeug.exceptions import BadRequest
 
 from app.exceptions import FileNotFound
+from app.logic.constants import BATCH_MAX_FILES, BATCH_MAX_UNZIPPED_SIZE
 
 
 def allowed_file(filename):
@@ -14,6 +20,30 @@ def allowed_file(filename):
     return filename.lower().endswith('.pdf')
 
 
+def is_flag_set(value):
+    """Check boolean query/form parameter
+    Args:
+       value (str|None): Raw parameter value
+    Returns:
+        bool
+    """
+    return (value or '').lower() in ('1', 'true', 'yes')
+
+
+def write_atomic(path, data):
+    """Write file under temporary name and move it in place, so readers
+    (other threads and processes) never see partial file
+    Args:
+       path (str): Destination file
+       data (str|bytes): File content
+    """
+    directory, file_name = os.path.split(path)
+    tmp_path = os.path.join(directory, f'.{file_name}.{os.getpid()}.{threading.get_ident()}')
+    with open(tmp_path, 'wb' if isinstance(data, bytes) else 'w') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
 def extract_binary(request):
     """Get binary file from request
     Args:
@@ -37,3 +67,56 @@ def extract_binary(request):
         return file_storage.stream.read()
 
     raise BadRequest('Bad file format')
+
+
+def extract_batch_binaries(request):
+    """Get all pdf files of batch request
+    Each 'files' part is either pdf document or zip archive with them.
+    Args:
+       request (flask.Request)
+    Returns:
+        list<tuple<str, bytes>>: file name and pdf document
+    Raises:
+        werkzeug.exceptions.BadRequest: when can't get files
+    """
+    documents = []
+    for file_storage in request.files.getlist('files'):
+        if not file_storage.filename:
+            continue
+        if file_storage.filename.lower().endswith('.zip'):
+            documents += _extract_zip_binaries(file_storage.stream.read())
+        elif allowed_file(file_storage.filename):
+            documents.append((file_storage.filename, file_storage.stream.read()))
+        else:
+            raise BadRequest(f'Bad file format: {file_storage.filename}')
+
+    if not documents:
+        raise FileNotFound
+    if len(documents) > BATCH_MAX_FILES:
+        raise BadRequest(f'Too many files, max {BATCH_MAX_FILES}')
+    if len({name for name, _ in documents}) != len(documents):
+        raise BadRequest('Duplicate file names')
+    return documents
+
+
+def _extract_zip_binaries(binary_archive):
+    """Get pdf documents from zip archive, other members are skipped
+    Raises:
+        werkzeug.exceptions.BadRequest: when archive is broken or too large
+    """
+    try:
+        with zipfile.ZipFile(BytesIO(binary_archive)) as archive:
+            members = [
+                info for info in archive.infolist()
+                if not info.is_dir() and allowed_file(info.filename)
+                and not info.filename.startswith('__MACOSX/')
+            ]
+            if len(members) > BATCH_MAX_FILES:
+                raise BadRequest(f'Too many files, max {BATCH_MAX_FILES}')
+            # declared sizes are checked before unpacking, reading never
+            # returns more than declared
+            if sum(info.file_size for info in members) > BATCH_MAX_UNZIPPED_SIZE:
+                raise BadRequest(f'Archive is too large, max {BATCH_MAX_UNZIPPED_SIZE} bytes unpacked')
+            return [(info.filename, archive.read(info)) for info in members]
+    except zipfile.BadZipFile as e:
+        raise BadRequest('Bad zip archive') from e
@@ -0,0 +1,262 @@
+"""Asynchronous detection jobs"""
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from app.detection import detect_document
+from app.exceptions import JobNotFinished, JobNotFound, JobQueueFull
+from app.helpers import write_atomic
+from app.logic.constants import JOB_QUEUE_SIZE, JOB_RESULT_TTL, JOB_STORE_DIR, JOB_WORKERS
+from app.logic.encoder import encode_error_body
+
+PENDING = 'pending'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class JobStore:
+    """Filesystem storage of job states and results
+    Shared by all app processes on the host, so a job submitted to one
+    gunicorn worker can be polled through any other.
+    Files:
+        <job_id>.json: {'status': str, 'message': str}
+        <job_id>.result.json: detect() response body
+    Attributes:
+        path (str): Storage directory
+        ttl (int): Seconds to keep jobs
+    """
+    def __init__(self, path=JOB_STORE_DIR, ttl=JOB_RESULT_TTL):
+        """
+        Attributes:
+            path (str): Storage directory
+            ttl (int): Seconds to keep jobs
+        """
+        self.path = path
+        self.ttl = ttl
+
+    def create(self):
+        """Register new pending job
+        Returns:
+            str: job_id
+        """
+        os.makedirs(self.path, exist_ok=True)
+        job_id = uuid.uuid4().hex
+        self.set_status(job_id, PENDING)
+        return job_id
+
+    def set_status(self, job_id, status, message=''):
+        """
+        Args:
+            job_id (str)
+            status (str): 'pending'|'done'|'failed'
+            message (str): Error message of failed job
+        """
+        self._write(f'{job_id}.json', json.dumps({'status': status, 'message': message}))
+
+    def set_result(self, job_id, body):
+        """Store result and mark job as done
+        Args:
+            job_id (str)
+            body (str): detect() response body
+        """
+        self._write(f'{job_id}.result.json', body)
+        self.set_status(job_id, DONE)
+
+    def get_status(self, job_id):
+        """
+        Args:
+            job_id (str)
+        Returns:
+            dict {
+                'status': 'pending'|'done'|'failed'
+                'message': str
+            }
+        Raises:
+            app.exceptions.JobNotFound
+        """
+        try:
+            with open(self._job_path(job_id, '.json')) as f:
+                return json.load(f)
+        except FileNotFoundError as e:
+            raise JobNotFound from e
+
+    def get_result(self, job_id):
+        """
+        Args:
+            job_id (str)
+        Returns:
+            str: detect() response body
+        Raises:
+            app.exceptions.JobNotFound
+            app.exceptions.JobNotFinished
+        """
+        if self.get_status(job_id)['status'] != DONE:
+            raise JobNotFinished
+        try:
+            with open(self._job_path(job_id, '.result.json')) as f:
+                return f.read()
+        except FileNotFoundError as e:
+            raise JobNotFound from e
+
+    def evict_expired(self):
+        """Delete jobs older than ttl"""
+        if not os.path.isdir(self.path):
+            return
+        expire_before = time.time() - self.ttl
+        for entry in os.scandir(self.path):
+            try:
+                if entry.stat().st_mtime < expire_before:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                # evicted by other process
+                pass
+
+    def _job_path(self, job_id, suffix):
+        try:
+            job_id = uuid.UUID(hex=job_id).hex
+        except ValueError as e:
+            raise JobNotFound from e
+        return os.path.join(self.path, job_id + suffix)
+
+    def _write(self, file_name, data):
+        write_atomic(os.path.join(self.path, file_name), data)
+
+
+job_store = JobStore()
+
+_executor = None
+_executor_lock = threading.Lock()
+# Bounds queued and running jobs of this process
+_queue_slots = threading.BoundedSemaphore(JOB_QUEUE_SIZE)
+
+
+def get_executor():
+    """Process pool for jobs, created on first use in each app process
+    Returns:
+        concurrent.futures.ProcessPoolExecutor
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=JOB_WORKERS)
+        return _executor
+
+
+def _replace_broken_executor(executor):
+    """Drop process pool broken by a dead worker (e.g. killed on OOM),
+    next get_executor call creates a new one
+    Args:
+        executor (concurrent.futures.ProcessPoolExecutor)
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False)
+
+
+def _submit(fn, *args):
+    """Submit task to the process pool, replacing the pool if it is broken
+    Returns:
+        tuple<concurrent.futures.ProcessPoolExecutor, concurrent.futures.Future>
+    """
+    executor = get_executor()
+    try:
+        return executor, executor.submit(fn, *args)
+    except BrokenProcessPool:
+        _replace_broken_executor(executor)
+    executor = get_executor()
+    return executor, executor.submit(fn, *args)
+
+
+def submit_job(binary_file, logger):
+    """Queue document detection
+    Args:
+        binary_file (bytes): Pdf document
+        logger (logging.Logger)
+    Returns:
+        str: job_id
+    Raises:
+        app.exceptions.JobQueueFull: when JOB_QUEUE_SIZE jobs are in progress
+    """
+    if not _queue_slots.acquire(blocking=False):
+        raise JobQueueFull
+    job_id = None
+    try:
+        job_store.evict_expired()
+        job_id = job_store.create()
+        executor, future = _submit(_run_job, job_store, job_id, binary_file)
+    except Exception as e:
+        _queue_slots.release()
+        if job_id is not None:
+            job_store.set_status(job_id, FAILED, str(e))
+        raise
+
+    def on_done(done_future):
+        _queue_slots.release()
+        # worker stores result itself, here only crashed workers are handled
+        exception = done_future.exception()
+        if exception is not None:
+            logger.error(f'Job {job_id} failed: {exception}')
+            job_store.set_status(job_id, FAILED, str(exception))
+            if isinstance(exception, BrokenProcessPool):
+                _replace_broken_executor(executor)
+
+    future.add_done_callback(on_done)
+    return job_id
+
+
+def run_batch(documents, logger):
+    """Detect documents in parallel on the job process pool
+    Worker processes are long-lived, so process startup and imports are
+    paid once for the whole batch instead of once per document.
+    Args:
+        documents (list<tuple<str, bytes>>): file name and pdf document
+        logger (logging.Logger)
+    Returns:
+        list<tuple<str, str>>: file name and its detect() response body,
+            {'success': False, 'message': str} for failed documents
+    """
+    futures = [
+        (name, *_submit(_run_batch_document, binary_file))
+        for name, binary_file in documents
+    ]
+    results = []
+    for name, executor, future in futures:
+        try:
+            results.append((name, future.result()))
+        except Exception as e:
+            # worker process crashed
+            logger.error(f'Batch document {name} failed: {e}')
+            results.append((name, encode_error_body(str(e))))
+            if isinstance(e, BrokenProcessPool):
+                _replace_broken_executor(executor)
+    return results
+
+
+def _run_batch_document(binary_file):
+    """Process pool task of batch document, runs detection within app context"""
+    from app.init import app
+
+    with app.app_context():
+        try:
+            return detect_document(binary_file)
+        except Exception as e:
+            app.logger.exception('BatchDocumentError')
+            return encode_error_body(str(e))
+
+
+def _run_job(store, job_id, binary_file):
+    """Process pool task, runs detection within app context"""
+    from app.init import app
+
+    with app.app_context():
+        try:
+            store.set_result(job_id, detect_document(binary_file))
+        except Exception as e:
+            app.logger.exception('JobError')
+            store.set_status(job_id, FAILED, str(e))
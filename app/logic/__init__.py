@@ -1 +1 @@
-from .pdf_utils import extract_elements_cv, extract_widgets_pdfminer
+from .pdf_utils import extract_elements_cv, extract_widgets_pdfminer, iter_elements_cv
@@ -1,4 +1,5 @@
 """Static values"""
+import os
 
 
 # For converting coordinates from pdf doc to jpg image system
@@ -7,3 +8,68 @@ CONVERT_COORD_COEF_PYPDF2 = PDF_DOCUMENT_SIZE/72
 RECTANGLES_OUTLINE_COLOR_1 = 'red'
 RECTANGLES_OUTLINE_COLOR_2 = 'blue'
 RECTANGLES_OUTLINE_WIDTH = 4
+
+# Number of processes for parallel page detection in CV path, 1 - sequential
+CV_PARALLEL_WORKERS = int(os.environ.get('CV_PARALLEL_WORKERS', 1))
+# Resolution of CV fillable areas detection. Below PDF_DOCUMENT_SIZE enables
+# coarse-to-fine mode: lines and checkboxes are found on low resolution page
+# (e.g. 150 - 4x less pixels), full resolution is rendered only for OCR
+CV_DETECTION_DPI = int(os.environ.get('CV_DETECTION_DPI', PDF_DOCUMENT_SIZE))
+
+# Debug images with detected areas
+DEBUG_OUTPUT_DIR = 'output'
+DEBUG_WORKERS = int(os.environ.get('DEBUG_WORKERS', 2))
+# Max detected pages with rasters waiting for debug drawing, per request
+DEBUG_QUEUE_SIZE = int(os.environ.get('DEBUG_QUEUE_SIZE', 2))
+# Seconds to keep per-request debug images
+DEBUG_OUTPUT_TTL = int(os.environ.get('DEBUG_OUTPUT_TTL', 3600))
+
+# 'page' - OCR whole page, 'regions' - OCR only areas around detected lines
+OCR_MODE = os.environ.get('OCR_MODE', 'page')
+# Extra pixels around OCR regions, so words crossing region border are not cut
+OCR_REGION_PADDING = 20
+# Max ratio of merged OCR region to the size of areas it covers,
+# keeps merging from growing into the whole page
+OCR_REGION_MAX_GROWTH = 1.25
+
+# Detect fillable areas in empty regions of CV pages ('EMPTY_REGIONS' elements),
+# opt-in because of unstable results
+DETECT_EMPTY_REGIONS = os.environ.get('DETECT_EMPTY_REGIONS', '0') == '1'
+
+# Skip line and checkbox detection on pages whose content can't draw them
+# (text without underscores), such pages are rendered only for empty regions
+PAGE_TRIAGE = os.environ.get('PAGE_TRIAGE', '1') == '1'
+
+# Find lines and checkboxes of born-digital pages from their vector content
+# and name them by text layer, scanned pages are still rendered and OCRed.
+# Pages are rendered anyway when DETECT_EMPTY_REGIONS is on
+VECTOR_DETECTION = os.environ.get('VECTOR_DETECTION', '1') == '1'
+
+# Max number of CV detected pages reused by content across documents, 0 - disabled
+PAGE_CACHE_SIZE = int(os.environ.get('PAGE_CACHE_SIZE', 512))
+
+# Send pages without form widgets of AcroForm documents through CV ('hybrid'),
+# 0 - AcroForm documents return widgets only ('pdf-form')
+HYBRID_DETECTION = os.environ.get('HYBRID_DETECTION', '1') == '1'
+
+# Asynchronous detection jobs
+JOB_STORE_DIR = os.environ.get('JOB_STORE_DIR', 'output/jobs')
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+# Max number of queued and running jobs per app process
+JOB_QUEUE_SIZE = int(os.environ.get('JOB_QUEUE_SIZE', 16))
+# Seconds to keep job results
+JOB_RESULT_TTL = int(os.environ.get('JOB_RESULT_TTL', 3600))
+
+# Max number of documents in batch request
+BATCH_MAX_FILES = int(os.environ.get('BATCH_MAX_FILES', 100))
+# Max total size of pdf documents unpacked from zip archive, in bytes
+BATCH_MAX_UNZIPPED_SIZE = int(os.environ.get('BATCH_MAX_UNZIPPED_SIZE', 200 * 1024 * 1024))
+
+# Detection results cache, keyed by document and detection config
+# Bump version when detection changes its results
+RESULT_CACHE_VERSION = 2
+# Max number of results kept in memory of each process, 0 - disabled
+RESULT_CACHE_SIZE = int(os.environ.get('RESULT_CACHE_SIZE', 128))
+RESULT_CACHE_DIR = os.environ.get('RESULT_CACHE_DIR', 'output/cache')
+# Max size of on-disk cache, 0 - disabled
+RESULT_CACHE_MAX_BYTES = int(os.environ.get('RESULT_CACHE_MAX_BYTES', 512 * 1024 * 1024))
@@ -101,4 +101,4 @@ class DocumentPage:
                 'page_number': int
             }]
         """
-        return [el.__dict__ for el in self._list]
+        return [el.to_dict() for el in self._list]
@@ -0,0 +1,142 @@
+"""JSON encoding of detection results"""
+import json
+from json.encoder import encode_basestring_ascii
+
+from app.logic.fillable_element import FillableElement
+
+_ELEMENT_KEYS = [f'{encode_basestring_ascii(field)}: ' for field in FillableElement.FIELDS]
+
+
+def encode_value(value):
+    """Encode single value the same way as json.dumps
+    Args:
+        value: Any json serializable value
+    Returns:
+        str
+    """
+    if value is None:
+        return 'null'
+    if value is True:
+        return 'true'
+    if value is False:
+        return 'false'
+    if type(value) is str:
+        return encode_basestring_ascii(value)
+    if type(value) is int:
+        return int.__repr__(value)
+    return json.dumps(value)
+
+
+def encode_element(fillable_element):
+    """Encode FillableElement straight from its slots, without building dict
+    Args:
+        fillable_element (logic.classes.FillableElement)
+    Returns:
+        str: JSON object, same as json.dumps(fillable_element.to_dict())
+    """
+    return '{' + ', '.join([
+        key + encode_value(getattr(fillable_element, field))
+        for key, field in zip(_ELEMENT_KEYS, FillableElement.FIELDS)
+    ]) + '}'
+
+
+def encode_page(doc_page):
+    """
+    Args:
+        doc_page (logic.classes.DocumentPage)
+    Returns:
+        str: JSON array, same as json.dumps(doc_page.fillable_elements_to_dict())
+    """
+    return '[' + ', '.join([
+        encode_element(fillable_element) for fillable_element in doc_page.fillable_elements
+    ]) + ']'
+
+
+def encode_detection_result(doc_pages, processing_method, **extra):
+    """Encode detect() response body in one pass over the pages
+    Args:
+        doc_pages (iterable<logic.classes.DocumentPage>)
+        processing_method (str)
+        extra (dict): Additional response keys, appended after 'result'
+    Returns:
+        str: JSON object {
+            'success': True,
+            'processing_method': str,
+            'result': list<list<dict>>,
+            **extra
+        }
+    """
+    parts = [
+        '{"success": true, "processing_method": ',
+        encode_value(processing_method),
+        ', "result": [',
+        ', '.join([encode_page(doc_page) for doc_page in doc_pages]),
+        ']',
+    ]
+    for key, value in extra.items():
+        parts += [', ', encode_basestring_ascii(key), ': ', encode_value(value)]
+    parts.append('}')
+    return ''.join(parts)
+
+
+def encode_page_line(doc_page):
+    """NDJSON line with the page elements
+    Args:
+        doc_page (logic.classes.DocumentPage)
+    Returns:
+        str: {'page_number': int, 'result': list<dict>} and newline
+    """
+    return f'{{"page_number": {doc_page.page_num}, "result": {encode_page(doc_page)}}}\n'
+
+
+def encode_summary_line(processing_method, page_count, **extra):
+    """Final NDJSON line of successful detection
+    Args:
+        processing_method (str)
+        page_count (int): Number of emitted page lines
+        extra (dict): Additional keys
+    Returns:
+        str: {'success': True, 'processing_method': str, 'pages': int, **extra}
+            and newline
+    """
+    return json.dumps({
+        'success': True,
+        'processing_method': processing_method,
+        'pages': page_count,
+        **extra,
+    }) + '\n'
+
+
+def encode_error_body(message):
+    """Body of failed detection, same as app error handler response
+    Args:
+        message (str)
+    Returns:
+        str: {'success': False, 'message': str}
+    """
+    return json.dumps({'success': False, 'message': message})
+
+
+def encode_error_line(message):
+    """Final NDJSON line of failed detection
+    Args:
+        message (str)
+    Returns:
+        str: {'success': False, 'message': str} and newline
+    """
+    return encode_error_body(message) + '\n'
+
+
+def encode_batch_result(results):
+    """Encode batch response body from already encoded documents results
+    Args:
+        results (list<tuple<str, str>>): file name and its JSON body
+    Returns:
+        str: JSON object {
+            'success': True,
+            'results': {<file name>: detect() response body}
+        }
+    """
+    return '{"success": true, "results": {' + ', '.join([
+        encode_basestring_ascii(name) + ': ' + body for name, body in results
+    ]) + '}}'
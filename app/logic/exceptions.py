@@ -5,3 +5,9 @@ class FillElementParseError(Exception):
     """When some error occurs on creation logic.classes.FillableElement"""
     def __init__(self):
         super().__init__("Error on fillable element parsing")
+
+
+class PageRenderError(Exception):
+    """When pdftoppm can't render pdf page"""
+    def __init__(self, message=''):
+        super().__init__(f"Error on page rendering {message}".strip())
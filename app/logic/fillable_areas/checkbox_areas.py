@@ -1,38 +1,52 @@
 import cv2
 import numpy as np
 
-from app.logic.fillable_areas.geometry.shapes import Rectangle
+from app.logic.fillable_areas.geometry.shapes import RectArray
 
-MIN_SIDE_LENGTH = 15
-MAX_SIDE_LENGTH = 70
-HORIZONTAL_KERNEL = (1, 15)
-VERTICAL_KERNEL = (15, 1)
+# lengths in points
+MIN_SIDE_LENGTH = 3.6
+MAX_SIDE_LENGTH = 16.8
+KERNEL_LENGTH = 3.6
 
 
-def find_checkbox_fillable_areas(gray):
-    _, img_bin = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
-    img_bin = 255 - img_bin
-
-    # kernel to detect horizontal lines
-    kernal_h = np.ones(HORIZONTAL_KERNEL, np.uint8)
-
-    # kernel to detect vertical lines
-    kernal_v = np.ones(VERTICAL_KERNEL, np.uint8)
-
+def find_checkbox_fillable_areas(context):
+    kernel_length = context.pixels(KERNEL_LENGTH)
     # horizontal kernel on the image
-    img_bin_h = cv2.morphologyEx(img_bin, cv2.MORPH_OPEN, kernal_h)
+    img_bin_h = context.opened('binary_otsu', (kernel_length, 1))
 
     # verical kernel on the image
-    img_bin_v = cv2.morphologyEx(img_bin, cv2.MORPH_OPEN, kernal_v)
+    img_bin_v = context.opened('binary_otsu', (1, kernel_length))
 
     # combining the image
     img_bin_final = img_bin_h | img_bin_v
     _, labels, stats, _ = cv2.connectedComponentsWithStats(~img_bin_final, connectivity=8, ltype=cv2.CV_32S)
 
-    checkboxes = []
-    for x, y, w, h, area in stats[2:]:
-        if MIN_SIDE_LENGTH <= np.abs(x - (x + w)) <= MAX_SIDE_LENGTH and MIN_SIDE_LENGTH <= np.abs(y - (y + h)) <= MAX_SIDE_LENGTH:
-            ratio = np.sqrt(w ** 2) / np.sqrt(h ** 2)
-            if 0.9 <= ratio <= 1.1:
-                checkboxes.append(Rectangle(x, y, x + w, y + h))
-    return checkboxes
+    return RectArray(filter_checkbox_candidates(
+        stats[2:],
+        context.pixels(MIN_SIDE_LENGTH),
+        context.pixels(MAX_SIDE_LENGTH),
+    ))
+
+
+def filter_checkbox_candidates(stats, min_side_length, max_side_length):
+    """Keep square components of checkbox size.
+
+    Args:
+        stats (numpy.ndarray): connectedComponentsWithStats stats rows
+            (x, y, w, h, area).
+        min_side_length (int): Min checkbox side in pixels.
+        max_side_length (int): Max checkbox side in pixels.
+
+    Returns:
+        numpy.ndarray: (N, 4) array of x1, y1, x2, y2 boxes.
+    """
+    x, y, w, h = stats[:, 0], stats[:, 1], stats[:, 2], stats[:, 3]
+    suitable = (
+        (min_side_length <= w) & (w <= max_side_length)
+        & (min_side_length <= h) & (h <= max_side_length)
+    )
+    x, y, w, h = x[suitable], y[suitable], w[suitable], h[suitable]
+    ratio = w / h
+    square = (0.9 <= ratio) & (ratio <= 1.1)
+    x, y, w, h = x[square], y[square], w[square], h[square]
+    return np.column_stack([x, y, x + w, y + h])
@@ -1,63 +1,68 @@
 """Logic for getting fillable areas in empty regions."""
 
-import copy
-
 import cv2
 import numpy as np
 
 from app.logic.fillable_areas.constants import ColorGray, ColorRGB
-from app.logic.fillable_areas.geometry.shapes import Rectangle
+from app.logic.fillable_areas.geometry.shapes import RectArray
+from app.logic.fillable_areas.units import REFERENCE_DPI, to_odd_pixels, to_pixels
 
-OUTER_FIELD_WIDTH = 150
-GAUSSIAN_BLUR_KERNEL = (15, 15)
-DILATE_KERNEL = (7, 7)
+# lengths in points
+OUTER_FIELD_WIDTH = 36
+GAUSSIAN_BLUR_KERNEL_SIZE = 3.6
+DILATE_KERNEL_SIZE = 1.68
 
 
-def find_empty_fillable_areas(gray, line_rectangles, fillable_area_limits):
+def find_empty_fillable_areas(gray, line_rectangles, fillable_area_limits, dpi=REFERENCE_DPI):
     """Find fillable areas on empty spots in the image.
 
     Args:
         gray (numpy.ndarray): Gray scale representation of the source image.
-        line_rectangles (list): List of the rectangles tied to horizontal
+        line_rectangles (shapes.RectArray): Rectangles tied to horizontal
             lines on the image.
         fillable_area_limits (dict): Dimension limits for fillable areas.
+        dpi (int): Resolution the image is rendered at.
 
     Returns:
-        list: List of fillable areas on empty areas.
+        shapes.RectArray: Fillable areas on empty areas.
     """
-    prepared_image = _mark_unfillable_areas(gray, line_rectangles)
+    outer_field_width = to_pixels(OUTER_FIELD_WIDTH, dpi)
+    prepared_image = _mark_unfillable_areas(
+        gray, line_rectangles, outer_field_width, dpi)
     contours = _get_empty_areas_contours(prepared_image)
     prepared_image = _exclude_line_areas(gray, line_rectangles)
     found_rectangles = _find_fillable_areas(
-        prepared_image, contours, fillable_area_limits)
+        prepared_image, contours, fillable_area_limits, outer_field_width)
     return merge_found_rectangles(found_rectangles, fillable_area_limits)
 
 
-def _mark_unfillable_areas(gray, line_rectangles):
+def _mark_unfillable_areas(gray, line_rectangles, outer_field_width, dpi):
     """Mark all occupied areas with black color."""
     image_height, image_width = gray.shape[:2]
-    blur = cv2.GaussianBlur(gray, GAUSSIAN_BLUR_KERNEL, 0)
+    blur_size = to_odd_pixels(GAUSSIAN_BLUR_KERNEL_SIZE, dpi)
+    blur = cv2.GaussianBlur(gray, (blur_size, blur_size), 0)
     thresh_lines = cv2.threshold(
         blur, ColorGray.WHITE.value - 1, ColorGray.WHITE.value,
         cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)[1]
 
     # Create rectangular structuring element and dilate
-    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, DILATE_KERNEL)
+    dilate_size = to_pixels(DILATE_KERNEL_SIZE, dpi)
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (dilate_size, dilate_size))
     dilate = cv2.dilate(thresh_lines, kernel, iterations=5)
     # Draw doc borders TODO: detect borders automatically
     invert = cv2.bitwise_not(dilate)
     cv2.rectangle(
-        invert, (0, 0), (image_width, OUTER_FIELD_WIDTH),
+        invert, (0, 0), (image_width, outer_field_width),
         ColorRGB.BLACK.value, -1)
     cv2.rectangle(
-        invert, (0, 0), (OUTER_FIELD_WIDTH, image_height),
+        invert, (0, 0), (outer_field_width, image_height),
         ColorRGB.BLACK.value, -1)
     cv2.rectangle(
-        invert, (0, image_height - OUTER_FIELD_WIDTH),
+        invert, (0, image_height - outer_field_width),
         (image_width, image_height),
         ColorRGB.BLACK.value, -1)
     cv2.rectangle(
-        invert, (image_width - OUTER_FIELD_WIDTH, 0),
+        invert, (image_width - outer_field_width, 0),
         (image_width, image_height),
         ColorRGB.BLACK.value, -1)
     # add line rectangles
@@ -66,7 +71,7 @@ def _mark_unfillable_areas(gray, line_rectangles):
             invert, (line.x1, line.y1), (line.x2, line.y2),
             ColorGray.BLACK.value, -1)
     # remove noise
-    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, GAUSSIAN_BLUR_KERNEL)
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (blur_size, blur_size))
     opening = cv2.morphologyEx(invert, cv2.MORPH_OPEN, kernel)
     return opening.copy()
 
@@ -95,67 +100,86 @@ def _exclude_line_areas(gray, line_rectangles):
 
 
 def _find_fillable_areas(
-        prepared_image, contours, fillable_area_limits):
+        prepared_image, contours, fillable_area_limits, outer_field_width):
     """Split found areas by lines."""
     min_height = fillable_area_limits['min_height']
-    found_rectangles = []
+    found_rectangles = [np.empty((0, 4), dtype=np.int64)]
     for c in contours:
         x, y, w, h = cv2.boundingRect(c)
-        found_rectangles += _find_fillable_areas_within_contour(
-            prepared_image, x, y, x + w, y + h, min_height)
-    return found_rectangles
+        found_rectangles.append(_find_fillable_areas_within_contour(
+            prepared_image, x, y, x + w, y + h, min_height, outer_field_width))
+    return np.concatenate(found_rectangles)
+
+
+def _find_fillable_areas_within_contour(
+        gray_image, x1, y1, x2, y2, edge, outer_field_width):
+    """Split contour by lines.
 
+    The contour bounding box is reshaped into a grid of edge x edge cells,
+    a cell is fillable when it has no black pixels. Horizontal runs of
+    fillable cells become rectangles. Processed cells are painted black,
+    so overlapping contours don't produce the same rectangles again.
 
-def _find_fillable_areas_within_contour(gray_image, x1, y1, x2, y2, edge):
-    """Split contour by lines."""
+    Returns:
+        numpy.ndarray: (N, 4) array of x1, y1, x2, y2 rectangles.
+    """
     image_height, image_width = gray_image.shape[:2]
-    rectangles = []
-    for y in range(y1, y2, edge):
-        current_rectangle = None
-        for x in range(x1, x2, edge):
-            # TODO: find some more elegant way
-            if x + edge > image_width - OUTER_FIELD_WIDTH:
-                continue
-            current_area = gray_image[y:y + edge, x:x + edge]
-            current_cell_fillable = np.amin(current_area) != 0
-            if current_cell_fillable:
-                if not current_rectangle:
-                    current_rectangle = Rectangle(x, y, x + edge, y + edge)
-                else:
-                    current_rectangle.x2 = x + edge
-                    current_rectangle.y2 = y + edge
-            else:
-                if current_rectangle:
-                    rectangles.append(current_rectangle)
-                    current_rectangle = None
-            cv2.rectangle(
-                gray_image, (x, y), (x + edge - 1, y + edge - 1),
-                ColorRGB.BLACK.value, -1)
-        if current_rectangle:
-            rectangles.append(current_rectangle)
-    return rectangles
+    # TODO: find some more elegant way
+    # cells crossing the right page margin are skipped
+    columns = len(range(x1, min(x2, image_width - outer_field_width - edge + 1), edge))
+    rows = len(range(y1, y2, edge))
+    if not rows or not columns:
+        return np.empty((0, 4), dtype=np.int64)
+
+    region = gray_image[y1:y1 + rows * edge, x1:x1 + columns * edge]
+    # partial cells at the bottom of the image are padded with white
+    padded = np.full((rows * edge, columns * edge), ColorGray.WHITE.value,
+                     dtype=gray_image.dtype)
+    padded[:region.shape[0]] = region
+    fillable = padded.reshape(rows, edge, columns, edge).min(axis=(1, 3)) != 0
+    region[:] = ColorGray.BLACK.value
+
+    # runs of fillable cells in each row
+    bounds = np.diff(np.pad(fillable, ((0, 0), (1, 1))).astype(np.int8), axis=1)
+    run_rows, run_starts = np.nonzero(bounds == 1)
+    _, run_ends = np.nonzero(bounds == -1)
+    return np.column_stack([
+        x1 + run_starts * edge,
+        y1 + run_rows * edge,
+        x1 + run_ends * edge,
+        y1 + run_rows * edge + edge,
+    ]).astype(np.int64)
 
 
 def merge_found_rectangles(found_rectangles, fillable_area_limits):
-    """Merge nearby areas if possible."""
+    """Merge nearby areas if possible.
+
+    Rectangles with the same x1, x2 and height, each exactly one step
+    below the previous one, are merged into a single rectangle.
+
+    Args:
+        found_rectangles (numpy.ndarray): (N, 4) array of rectangles.
+        fillable_area_limits (dict): Dimension limits for fillable areas.
+
+    Returns:
+        shapes.RectArray: Merged rectangles ordered by y1, x1.
+    """
     step = fillable_area_limits['min_height']
-    sorted_rectangles = {
-        r.coordinates: r
-        for r in sorted(found_rectangles, key=lambda r: (r.y1, r.x1))
-    }
-    processed_retangles = set()
-    merged_rectangles = []
-    for coordinates, rectangle in sorted_rectangles.items():
-        if rectangle not in processed_retangles:
-            processed_retangles.add(rectangle)
-            r = copy.copy(rectangle)
-            i = 1
-            while new_rectangle := sorted_rectangles.get(
-                    (rectangle.x1, rectangle.y1 + step * i,
-                     rectangle.x2, rectangle.y2 + step * i)
-            ):
-                r.y2 = new_rectangle.y2
-                processed_retangles.add(new_rectangle)
-                i += 1
-            merged_rectangles.append(r)
-    return merged_rectangles
+    if not len(found_rectangles):
+        return RectArray()
+    boxes = np.unique(found_rectangles, axis=0)
+    heights = boxes[:, 3] - boxes[:, 1]
+    boxes = boxes[np.lexsort((boxes[:, 1], heights, boxes[:, 2], boxes[:, 0]))]
+    heights = boxes[:, 3] - boxes[:, 1]
+
+    chain_start = np.ones(len(boxes), dtype=bool)
+    chain_start[1:] = (
+        (boxes[1:, 0] != boxes[:-1, 0])
+        | (boxes[1:, 2] != boxes[:-1, 2])
+        | (heights[1:] != heights[:-1])
+        | (boxes[1:, 1] != boxes[:-1, 1] + step)
+    )
+    merged = boxes[chain_start]
+    merged[:, 3] = np.maximum.reduceat(boxes[:, 3], np.flatnonzero(chain_start))
+    return RectArray(
+        merged[np.lexsort((merged[:, 2], merged[:, 0], merged[:, 1]))])
@@ -1,43 +1,103 @@
 """Logic for getting fillable areas."""
 
-import cv2
-import numpy as np
-
 from app.logic.fillable_areas.empty_areas import find_empty_fillable_areas
 from app.logic.fillable_areas.horizonal_line_areas import find_line_fillable_areas
 from app.logic.fillable_areas.checkbox_areas import find_checkbox_fillable_areas
+from app.logic.fillable_areas.geometry.shapes import RectArray
+from app.logic.fillable_areas.page_context import PageImageContext
+from app.logic.fillable_areas.units import REFERENCE_DPI
+from app.logic.fillable_areas.vector_areas import (
+    find_vector_checkbox_areas, find_vector_line_areas)
 
 
-def find_fillable_areas(image):
+def find_fillable_areas(image, detect_empty_regions=False, detect_lines=True):
     """Find all fillable areas.
 
     Args:
-        image (numpy.ndarray): Source image.
+        image (numpy.ndarray|page_context.PageImageContext): Source image.
+        detect_empty_regions (bool): Also look for fillable areas on
+            empty spots of the image.
+        detect_lines (bool): Look for lines and checkboxes, off for
+            pages known to have none.
 
     Returns:
         dict: Lists of found fillable areas.
     """
-    fillable_area_limits = _calc_fillable_area_limits(image)
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    line_rectangles = find_line_fillable_areas(gray, fillable_area_limits)
-    # temporary disabled
-    # empty_fillable_rectangles = find_empty_fillable_areas(
-    #     gray, line_rectangles, fillable_area_limits)
-    checkbox_areas = find_checkbox_fillable_areas(gray)
+    context = _as_context(image)
+    fillable_area_limits = _calc_fillable_area_limits(context.shape)
+    line_rectangles = RectArray()
+    checkbox_areas = RectArray()
+    if detect_lines:
+        line_rectangles = find_line_fillable_areas(
+            context, fillable_area_limits)
+        checkbox_areas = find_checkbox_fillable_areas(context)
+    filtered_empty_fillable_rectangles = RectArray()
+    if detect_empty_regions:
+        filtered_empty_fillable_rectangles = find_empty_region_areas(
+            context, line_rectangles)
 
     filtered_line_rectangles = _filter_areas(
         line_rectangles, fillable_area_limits)
-    # filtered_empty_fillable_rectangles = _filter_areas(
-    #     empty_fillable_rectangles, fillable_area_limits)
     return {
         'line_areas': filtered_line_rectangles,
         'checkbox_areas': checkbox_areas,
+        'empty_region_areas': filtered_empty_fillable_rectangles,
+    }
+
+
+def find_vector_fillable_areas(shape, strokes, obstacles, dpi=REFERENCE_DPI):
+    """Find line and checkbox fillable areas from vector page content.
+
+    Args:
+        shape (tuple): Page height and width in pixels.
+        strokes (numpy.ndarray): (N, 4) boxes of axis-aligned strokes and
+            filled rectangles.
+        obstacles (numpy.ndarray): (M, 4) boxes of everything drawn on
+            the page, strokes included.
+        dpi (int): Resolution of the pixel coordinates.
+
+    Returns:
+        dict: Lists of found fillable areas, the same as
+            find_fillable_areas returns without empty regions.
+    """
+    fillable_area_limits = _calc_fillable_area_limits(shape)
+    line_rectangles = find_vector_line_areas(
+        shape, strokes, obstacles, fillable_area_limits, dpi)
+    return {
+        'line_areas': _filter_areas(line_rectangles, fillable_area_limits),
+        'checkbox_areas': find_vector_checkbox_areas(strokes, dpi),
+        'empty_region_areas': RectArray(),
     }
 
 
-def _calc_fillable_area_limits(image):
+def find_empty_region_areas(image, line_rectangles):
+    """Find fillable areas on empty spots of the image.
+
+    Args:
+        image (numpy.ndarray|page_context.PageImageContext): Source image.
+        line_rectangles (shapes.RectArray): Fillable areas above lines,
+            at the image resolution.
+
+    Returns:
+        shapes.RectArray: Fillable areas on empty areas.
+    """
+    context = _as_context(image)
+    fillable_area_limits = _calc_fillable_area_limits(context.shape)
+    empty_fillable_rectangles = find_empty_fillable_areas(
+        context.gray, line_rectangles, fillable_area_limits, context.dpi)
+    return _filter_areas(empty_fillable_rectangles, fillable_area_limits)
+
+
+def _as_context(image):
+    """Wrap raw image into context."""
+    return (
+        image if isinstance(image, PageImageContext)
+        else PageImageContext(image))
+
+
+def _calc_fillable_area_limits(shape):
     """Calculate fillable area limits by image size."""
-    image_height, image_width, _ = image.shape
+    image_height, image_width = shape[:2]
     min_height = int(image_height * .015)
     max_height = int(min_height * 1.2)
     min_width = int(image_width * .015)
@@ -55,7 +115,4 @@ def _calc_fillable_area_limits(image):
 def _filter_areas(areas, fillable_area_limits):
     """Filter found areas."""
     # TODO: Define more rules if needed
-    return [
-        area for area in areas
-        if area.x2 - area.x1 >= fillable_area_limits['min_width']
-    ]
+    return areas.filter(areas.widths >= fillable_area_limits['min_width'])
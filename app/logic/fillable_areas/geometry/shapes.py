@@ -1,9 +1,13 @@
 """Shape primitives."""
 
+import numpy as np
+
 
 class Rectangle:
     """Rectangle representation."""
 
+    __slots__ = ('x1', 'y1', 'x2', 'y2')
+
     def __init__(self, x1, y1, x2, y2):
         """Rectangle class initialization.
 
@@ -32,5 +36,158 @@ class Rectangle:
         return self.x1, self.y1, self.x2, self.y2
 
 
-# Line has the same implementation as Rectangle
-Line = Rectangle
+class RectArray:
+    """Columnar collection of rectangles.
+
+    Rectangles are stored as rows of an (N, 4) integer array of
+    x1, y1, x2, y2, so stages can filter and transform all of them at
+    once. Iteration and integer indexing return scalar Rectangle
+    objects for compatibility with code working on single shapes.
+    """
+
+    __slots__ = ('boxes',)
+
+    def __init__(self, boxes=()):
+        """RectArray class initialization.
+
+        Args:
+            boxes (numpy.ndarray|list): (N, 4) x1, y1, x2, y2 values.
+        """
+        self.boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+
+    @classmethod
+    def from_rectangles(cls, rectangles):
+        """Build from scalar shapes.
+
+        Args:
+            rectangles (iterable): Rectangle objects.
+
+        Returns:
+            RectArray: Collection of the same rectangles.
+        """
+        return cls([rectangle.coordinates for rectangle in rectangles])
+
+    @classmethod
+    def concatenate(cls, arrays):
+        """Join several collections into one.
+
+        Args:
+            arrays (iterable): RectArray objects.
+
+        Returns:
+            RectArray: Rectangles of all collections in the same order.
+        """
+        return cls(np.concatenate(
+            [np.empty((0, 4), dtype=np.int64)] + [a.boxes for a in arrays]))
+
+    def __len__(self):
+        """Number of rectangles."""
+        return len(self.boxes)
+
+    def __iter__(self):
+        """Iterate over scalar Rectangle objects."""
+        for x1, y1, x2, y2 in self.boxes.tolist():
+            yield Rectangle(x1, y1, x2, y2)
+
+    def __getitem__(self, key):
+        """Rectangle by integer index, RectArray by slice or mask."""
+        if isinstance(key, (int, np.integer)):
+            return Rectangle(*self.boxes[key])
+        return RectArray(self.boxes[key])
+
+    @property
+    def x1(self):
+        """Column of first point x coordinates."""
+        return self.boxes[:, 0]
+
+    @property
+    def y1(self):
+        """Column of first point y coordinates."""
+        return self.boxes[:, 1]
+
+    @property
+    def x2(self):
+        """Column of second point x coordinates."""
+        return self.boxes[:, 2]
+
+    @property
+    def y2(self):
+        """Column of second point y coordinates."""
+        return self.boxes[:, 3]
+
+    @property
+    def widths(self):
+        """Rectangle widths."""
+        return self.x2 - self.x1
+
+    @property
+    def heights(self):
+        """Rectangle heights."""
+        return self.y2 - self.y1
+
+    def filter(self, mask):
+        """Keep rectangles where mask is True.
+
+        Args:
+            mask (numpy.ndarray): Boolean value for each rectangle.
+
+        Returns:
+            RectArray: Selected rectangles.
+        """
+        return RectArray(self.boxes[mask])
+
+    def translate(self, dx, dy):
+        """Shift all rectangles.
+
+        Args:
+            dx (int): Shift along x axis.
+            dy (int): Shift along y axis.
+
+        Returns:
+            RectArray: Shifted rectangles.
+        """
+        return RectArray(self.boxes + (dx, dy, dx, dy))
+
+    def scale(self, factor):
+        """Scale all coordinates, e.g. between rendering resolutions.
+
+        Args:
+            factor (float): Scale factor.
+
+        Returns:
+            RectArray: Scaled rectangles, coordinates are rounded.
+        """
+        return RectArray(np.rint(self.boxes * factor))
+
+    def intersects(self, box):
+        """Check which rectangles overlap the box.
+
+        Args:
+            box (tuple): x1, y1, x2, y2 coordinates.
+
+        Returns:
+            numpy.ndarray: Boolean value for each rectangle.
+        """
+        x1, y1, x2, y2 = box
+        return (
+            (self.x1 < x2) & (x1 < self.x2)
+            & (self.y1 < y2) & (y1 < self.y2)
+        )
+
+    def intersection(self, box):
+        """Clip rectangles by the box, drop ones outside of it.
+
+        Args:
+            box (tuple): x1, y1, x2, y2 coordinates.
+
+        Returns:
+            RectArray: Non-empty intersections.
+        """
+        x1, y1, x2, y2 = box
+        clipped = self.boxes[self.intersects(box)]
+        return RectArray(np.column_stack([
+            np.maximum(clipped[:, 0], x1),
+            np.maximum(clipped[:, 1], y1),
+            np.minimum(clipped[:, 2], x2),
+            np.minimum(clipped[:, 3], y2),
+        ]))
@@ -1,48 +1,41 @@
 """Logic for getting fillable areas based on horizontal lines."""
 
-import itertools
-
 import cv2
 import numpy as np
 from PIL import Image, ImageDraw
 
-from app.logic.fillable_areas.constants import ColorGray
-from app.logic.fillable_areas.geometry.shapes import Line
-from app.logic.fillable_areas.geometry.shapes import Rectangle
-from app.logic.fillable_areas.geometry.utils import find_intersection
+from app.logic.fillable_areas.geometry.shapes import RectArray
+
+# lengths in points
+MARGIN = 1.2
+TOLERANCE = 1.2
+HORIZONTAL_GROW_STEP = 1.2
 
-MARGIN = 5
-TOLERANCE = 5
-VERTICAL_GROW_STEP = 1
-HORIZONTAL_GROW_STEP = 5
+HORIZONTAL_KERNEL_LENGTH = 7.2
+VERTICAL_KERNEL_LENGTH = 12
+TABLE_KERNEL_LENGTH = 9.6
+TABLE_MIN_SIDE_LENGTH = 48
 
-HORIZONTAL_KERNEL = (30, 1)
-VERTICAL_KERNEL = (1, 50)
+# Max size of horizontal x vertical lines matrix processed at once
+SPLIT_CHUNK_CELLS = 1_000_000
 
 
-def find_line_fillable_areas(gray, fillable_area_limits):
+def find_line_fillable_areas(context, fillable_area_limits):
     """Find fillable areas based on horizontal lines.
 
     Args:
-        gray (numpy.ndarray): Gray scale representation of the source image.
-        line_rectangles (list): List of the rectangles tied to horizontal
-            lines on the image.
+        context (page_context.PageImageContext): Source image with
+            shared preprocessing.
         fillable_area_limits (dict): Dimension limits for fillable areas.
 
     Returns:
-        list: List of fillable areas on empty areas.
+        shapes.RectArray: Fillable areas above horizontal lines.
     """
-    thresh = cv2.threshold(
-        gray, ColorGray.BLACK.value, ColorGray.WHITE.value,
-        cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU
-    )[1]
+    thresh = context.binary_otsu
     # Image.fromarray(thresh).show()
     # Horizontal lines
-    horizontal_kernel = cv2.getStructuringElement(
-        cv2.MORPH_RECT, HORIZONTAL_KERNEL
-    )
-    detect_horizontal = cv2.morphologyEx(
-        thresh, cv2.MORPH_OPEN, horizontal_kernel, iterations=2
+    detect_horizontal = context.opened(
+        'binary_otsu', (context.pixels(HORIZONTAL_KERNEL_LENGTH), 1), iterations=2
     )
     # Image.fromarray(detect_horizontal).show()
     cnts = cv2.findContours(
@@ -57,16 +50,13 @@ def find_line_fillable_areas(gray, fillable_area_limits):
     for i, c in enumerate(cnts):
         x, y, w, h = cv2.boundingRect(c)
         # draw.rectangle((x, y, x + w, y), outline='white', width=10)
-        horizontal_lines.append(Line(x, y, x + w, y))
+        horizontal_lines.append((x, y, x + w, y))
     # image_with_horizontal_boxes.show()
 
     # Vertical lines
     vertical_lines = []
-    vertical_kernel = cv2.getStructuringElement(
-        cv2.MORPH_RECT, VERTICAL_KERNEL
-    )
-    detect_vertical = cv2.morphologyEx(
-        thresh, cv2.MORPH_OPEN, vertical_kernel, iterations=2
+    detect_vertical = context.opened(
+        'binary_otsu', (1, context.pixels(VERTICAL_KERNEL_LENGTH)), iterations=2
     )
     # Image.fromarray(detect_vertical).show()
     cnts = cv2.findContours(
@@ -79,64 +69,112 @@ def find_line_fillable_areas(gray, fillable_area_limits):
     for c in cnts:
         x, y, w, h = cv2.boundingRect(c)
         # draw.rectangle((x + w, y, x + w, y + h), outline='white', width=10)
-        vertical_lines.append(Line(x + w, y, x + w, y + h))
+        vertical_lines.append((x + w, y, x + w, y + h))
     # image_with_vertical_boxes.show()
 
     # Split lines
-    lines = []
-    # image_with_segments = Image.fromarray(thresh)
-    # draw = ImageDraw.Draw(image_with_segments)
-    for i, hl in enumerate(horizontal_lines):
-        split_points = []
-        for vl in vertical_lines:
-            x, y = find_intersection(hl, vl)
-            if hl.x1 - TOLERANCE <= x <= hl.x2 + TOLERANCE and vl.y1 - TOLERANCE <= y <= vl.y2 + TOLERANCE:
-                split_points.append((x, y))
-        if split_points:
-            all_points = sorted(
-                list(set([hl.x1, hl.x2] + [x for x, y in split_points]))
-            )
-            segments = _in_pairs(all_points)
-            for segment in segments:
-                x_start, x_end = segment
-                if x_end - x_start >= fillable_area_limits['table_cell_min_width']:
-                    line = Line(x_start, hl.y1, x_end, hl.y2)
-                    # draw.rectangle((x_start, hl.y1, x_end, hl.y2), outline='white', width=10)
-                    lines.append(line)
-        else:
-            lines.append(hl)
-    # image_with_segments.show()
+    lines = split_lines_by_table_grid(
+        np.array(horizontal_lines, dtype=np.int64).reshape(-1, 4),
+        np.array(vertical_lines, dtype=np.int64).reshape(-1, 4),
+        fillable_area_limits['table_cell_min_width'],
+        context.pixels(TOLERANCE),
+    )
     # Horizontal line rectangles
-    line_rectangles = []
-    tables_upper_borders = _find_tables_upper_lines(gray)
+    tables_upper_borders = _find_tables_upper_lines(context)
 
     # debug
-    # image_with_fillable_areas = Image.fromarray(gray)
+    # image_with_fillable_areas = Image.fromarray(context.gray)
     # draw = ImageDraw.Draw(image_with_fillable_areas)
-    for i, line in enumerate(lines):
-        if i>=0:  # todo: change i to line number (from bottom to top) -> debug
-            rectangle = _find_fillable_line_area(
-                thresh, line, fillable_area_limits, tables_upper_borders
-            )
-            if rectangle:
-                x1, y1, x2, y2 = rectangle
-                r = Rectangle(x1, y1, x2, y2)
-                line_rectangles.append(r)
-                # draw.rectangle((x1, y1, x2, y2), outline='black', width=10)
-                # draw.text((x1+10, y1+10), str(i), fill='black')
+    # for i, (x1, y1, x2, y2) in enumerate(line_rectangles.boxes):
+    #     draw.rectangle((x1, y1, x2, y2), outline='black', width=10)
+    #     draw.text((x1+10, y1+10), str(i), fill='black')
     # draw.rectangle(tables_upper_borders[0], outline='black', width=10)
     # image_with_fillable_areas.show()
-    return line_rectangles
+    return _find_fillable_line_areas(
+        thresh, lines, fillable_area_limits, tables_upper_borders,
+        context.pixels(MARGIN),
+    )
+
+
+def split_lines_by_table_grid(horizontal_lines, vertical_lines, table_cell_min_width, tolerance):
+    """Split horizontal lines at vertical lines crossing them.
+
+    All lines are axis-aligned, so the intersection of horizontal and
+    vertical lines is (vertical x, horizontal y). Split points for all
+    lines are found in one batched pass.
+
+    Args:
+        horizontal_lines (numpy.ndarray): (N, 4) array of x1, y, x2, y.
+        vertical_lines (numpy.ndarray): (M, 4) array of x, y1, x, y2.
+        table_cell_min_width (int): Min width of split segment to keep.
+        tolerance (int): Max distance in pixels between crossing lines.
 
+    Returns:
+        shapes.RectArray: Lines without split points and wide enough
+            segments, in order of the source lines.
+    """
+    line_indexes = np.arange(len(horizontal_lines))
+    rows, split_xs = _find_split_points(horizontal_lines, vertical_lines, tolerance)
+    has_split = np.zeros(len(horizontal_lines), dtype=bool)
+    has_split[rows] = True
+
+    # Split points of each line together with its ends, sorted and unique
+    split_rows = line_indexes[has_split]
+    rows = np.concatenate([rows, split_rows, split_rows])
+    xs = np.concatenate([
+        split_xs,
+        horizontal_lines[split_rows, 0],
+        horizontal_lines[split_rows, 2],
+    ])
+    order = np.lexsort((xs, rows))
+    rows, xs = rows[order], xs[order]
+    unique = np.ones(len(rows), dtype=bool)
+    unique[1:] = (rows[1:] != rows[:-1]) | (xs[1:] != xs[:-1])
+    rows, xs = rows[unique], xs[unique]
 
-def _in_pairs(iterable):
-    """Pairs of values from the iterable object."""
-    a, b = itertools.tee(iterable)
-    next(b, None)
-    return zip(a, b)
+    # Segments between consecutive points of the same line
+    same_line = rows[1:] == rows[:-1]
+    segment_rows = rows[:-1][same_line]
+    segment_x1 = xs[:-1][same_line]
+    segment_x2 = xs[1:][same_line]
+    wide = segment_x2 - segment_x1 >= table_cell_min_width
 
+    plain_rows = line_indexes[~has_split]
+    rows = np.concatenate([segment_rows[wide], plain_rows])
+    x1 = np.concatenate([segment_x1[wide], horizontal_lines[plain_rows, 0]])
+    x2 = np.concatenate([segment_x2[wide], horizontal_lines[plain_rows, 2]])
+    order = np.argsort(rows, kind='stable')
+    rows = rows[order]
+    return RectArray(np.column_stack([
+        x1[order], horizontal_lines[rows, 1], x2[order], horizontal_lines[rows, 3]
+    ]))
 
-def _find_tables_upper_lines(gray):
+
+def _find_split_points(horizontal_lines, vertical_lines, tolerance):
+    """Find crossings of horizontal and vertical lines within tolerance.
+
+    Returns:
+        tuple: Horizontal line indexes and x coordinates of crossings.
+    """
+    rows, xs = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)]
+    if not len(vertical_lines):
+        return rows[0], xs[0]
+    vx, vy1, vy2 = vertical_lines[:, 0], vertical_lines[:, 1], vertical_lines[:, 3]
+    chunk = max(1, SPLIT_CHUNK_CELLS // len(vertical_lines))
+    for start in range(0, len(horizontal_lines), chunk):
+        hl = horizontal_lines[start:start + chunk]
+        hx1, hy, hx2 = hl[:, [0]], hl[:, [1]], hl[:, [2]]
+        crossing = (
+            (hx1 - tolerance <= vx) & (vx <= hx2 + tolerance)
+            & (vy1 - tolerance <= hy) & (hy <= vy2 + tolerance)
+        )
+        hit_rows, hit_columns = np.nonzero(crossing)
+        rows.append(hit_rows + start)
+        xs.append(vx[hit_columns])
+    return np.concatenate(rows), np.concatenate(xs)
+
+
+def _find_tables_upper_lines(context):
     # ToDo: add multiple tables support
     """
     Find upper lines of tables.
@@ -145,17 +183,12 @@ def _find_tables_upper_lines(gray):
     # return []
     table_coords = None
     upper_borders_coordinates = []
-    binary = cv2.adaptiveThreshold(
-        gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 11, 2
-    )
-
     # Detect horizontal lines
-    horizontal_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (40, 1))
-    detect_horizontal = cv2.morphologyEx(binary, cv2.MORPH_OPEN, horizontal_kernel, iterations=2)
+    kernel_length = context.pixels(TABLE_KERNEL_LENGTH)
+    detect_horizontal = context.opened('binary_adaptive', (kernel_length, 1), iterations=2)
 
     # Detect vertical lines
-    vertical_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, 40))
-    detect_vertical = cv2.morphologyEx(binary, cv2.MORPH_OPEN, vertical_kernel, iterations=2)
+    detect_vertical = context.opened('binary_adaptive', (1, kernel_length), iterations=2)
 
     # Combine horizontal and vertical lines in a new third image, with an intersection point at each cell
     mask = cv2.addWeighted(detect_horizontal, 0.5, detect_vertical, 0.5, 0.0)
@@ -168,7 +201,8 @@ def _find_tables_upper_lines(gray):
         largest_contour = max(contours, key=cv2.contourArea)
         x, y, w, h = cv2.boundingRect(largest_contour)
         # ToDo: use table_min_cell_width here
-        if h > 200 and w > 200:
+        min_side_length = context.pixels(TABLE_MIN_SIDE_LENGTH)
+        if h > min_side_length and w > min_side_length:
             table_coords = (x, y, x + w, y + h)
 
     # Draw the largest contour (table border) on the original image for visualization
@@ -177,41 +211,93 @@ def _find_tables_upper_lines(gray):
     return upper_borders_coordinates
 
 
-def _find_fillable_line_area(image, line, fillable_area_limits, tables_upper_borders):
-    """Find fillable area above the line."""
+def find_areas_above_lines(lines, image_width, fillable_area_limits, tables_upper_borders, margin,
+                           measure_clear_height):
+    """Find fillable areas above lines with enough clear height.
+
+    Shared by image and vector detection, which differ only in how the
+    clear height above lines is measured.
+
+    Args:
+        lines (shapes.RectArray): Horizontal lines.
+        image_width (int): Page width in pixels.
+        fillable_area_limits (dict): Dimension limits for fillable areas.
+        tables_upper_borders (list): Upper borders of tables, lines on
+            them are not fillable.
+        margin (int): Pixels cut from both ends of each line.
+        measure_clear_height (callable): Takes arrays of line rows and
+            of column ranges start and end, and max_height. Returns
+            array of clear heights above lines, at most max_height.
+
+    Returns:
+        shapes.RectArray: Fillable areas of suitable lines.
+    """
+    if not len(lines):
+        return RectArray()
     min_height = fillable_area_limits['min_height']
     max_height = fillable_area_limits['max_height']
 
+    coords = lines.boxes
+    x1 = coords[:, 0] + margin
+    x2 = coords[:, 2] - margin
+    y = coords[:, 1]
+    columns_start = np.minimum(x1, image_width)
+    columns_end = np.clip(x2, 0, image_width)
+    clear_height = measure_clear_height(y, columns_start, columns_end, max_height)
+
+    suitable = (columns_end > columns_start) & (clear_height >= min_height)
     for table_upper_border in tables_upper_borders:
-        if table_upper_border[1] == line.y1 and line.x2-line.x1 <= table_upper_border[2]-table_upper_border[0]:
-            return None
-
-    all_min_area = image[line.y1 - min_height:line.y1, line.x1 + MARGIN:line.x2 - MARGIN]
-    # is_suitable_area means that there are all black pixels in the area (0 because of binary image)
-    is_suitable_area = (
-            all_min_area.shape[0] and
-            all_min_area.shape[1] and
-            np.amax(all_min_area) == 0
+        suitable &= ~(
+            (y == table_upper_border[1])
+            & (coords[:, 2] - coords[:, 0] <= table_upper_border[2] - table_upper_border[0])
+        )
+
+    return RectArray(np.column_stack([
+        x1, y - clear_height, x2, y
+    ])).filter(suitable)
+
+
+def _find_fillable_line_areas(image, lines, fillable_area_limits, tables_upper_borders, margin):
+    """Find fillable areas above all lines at once.
+
+    Clear height above each line is the number of empty rows right above
+    it within the line width. It is taken from row-wise prefix sums of
+    the binary image rows above the lines, so every row range is checked
+    in O(1).
+
+    Args:
+        image (numpy.ndarray): Binary image, lines and text are white.
+        lines (shapes.RectArray): Horizontal lines.
+        fillable_area_limits (dict): Dimension limits for fillable areas.
+        tables_upper_borders (list): Upper borders of tables, lines on
+            them are not fillable.
+        margin (int): Pixels cut from both ends of each line.
+
+    Returns:
+        shapes.RectArray: Fillable areas of suitable lines.
+    """
+    def measure_clear_height(y, columns_start, columns_end, max_height):
+        # rows above each line, from the nearest one up to max_height
+        rows = y[:, None] - 1 - np.arange(max_height)
+        inside = rows >= 0
+        rows = np.where(inside, rows, 0)
+
+        # occupied[r, c] - number of non-black pixels in row r before column c,
+        # only for rows which are above some line
+        needed_rows, rows = np.unique(rows, return_inverse=True)
+        rows = rows.reshape(inside.shape)
+        occupied = np.zeros((len(needed_rows), image.shape[1] + 1), dtype=np.int32)
+        np.cumsum(image[needed_rows] != 0, axis=1, out=occupied[:, 1:])
+
+        blocked = (
+            (occupied[rows, columns_end[:, None]] - occupied[rows, columns_start[:, None]] != 0)
+            | ~inside
+        )
+        # sentinel column, so lines without obstacles get max_height
+        blocked = np.concatenate([blocked, np.ones((len(y), 1), dtype=bool)], axis=1)
+        return blocked.argmax(axis=1)
+
+    return find_areas_above_lines(
+        lines, image.shape[1], fillable_area_limits, tables_upper_borders, margin,
+        measure_clear_height,
     )
-    if is_suitable_area:
-        for i in range(1, max_height - min_height + 1, VERTICAL_GROW_STEP):
-            current_area = (
-                image[
-                line.y1 - min_height - i:line.y1,
-                line.x1 + MARGIN:line.x2 - MARGIN]
-            )
-            is_current_area_suitable = (
-                    current_area.shape[0] and
-                    current_area.shape[1] and
-                    np.amax(current_area) == 0
-            )
-            if not is_current_area_suitable:
-                return (
-                    line.x1 + MARGIN,
-                    line.y1 - min_height - i + VERTICAL_GROW_STEP,
-                    line.x2 - MARGIN,
-                    line.y1)
-        return (
-            line.x1 + MARGIN, line.y1 - max_height,
-            line.x2 - MARGIN, line.y1)
-    return None
\ No newline at end of file
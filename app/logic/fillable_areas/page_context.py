@@ -0,0 +1,108 @@
+"""Shared per-page preprocessing."""
+
+import cv2
+
+from app.logic.fillable_areas.constants import ColorGray
+from app.logic.fillable_areas.units import REFERENCE_DPI, to_pixels
+
+
+class PageImageContext:
+    """Page image with lazily computed and cached derived images.
+
+    Detection stages take the context instead of the raw image, so gray
+    conversion, binarization and identical morphology passes are computed
+    once per page no matter how many stages need them.
+    """
+
+    def __init__(self, image, dpi=REFERENCE_DPI):
+        """PageImageContext class initialization.
+
+        Args:
+            image (numpy.ndarray): Source page image, BGR or grayscale.
+            dpi (int): Resolution the page is rendered at.
+        """
+        self.image = image
+        self.dpi = dpi
+        self._cache = {}
+
+    def pixels(self, points):
+        """Convert length to pixels of this page.
+
+        Args:
+            points (float): Length in points.
+
+        Returns:
+            int: Length in pixels.
+        """
+        return to_pixels(points, self.dpi)
+
+    def _get(self, key, compute):
+        """Get cached value, compute it on first access."""
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    @property
+    def shape(self):
+        """Source image shape.
+
+        Returns:
+            tuple: Source image shape.
+        """
+        return self.image.shape
+
+    @property
+    def gray(self):
+        """Gray scale representation of the source image.
+
+        Returns:
+            numpy.ndarray: Gray scale image.
+        """
+        if self.image.ndim == 2:
+            # rendered in grayscale already
+            return self.image
+        return self._get(
+            'gray', lambda: cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY))
+
+    @property
+    def binary_otsu(self):
+        """Inverted binary image, Otsu threshold.
+
+        Returns:
+            numpy.ndarray: Binary image, white for dark source pixels.
+        """
+        return self._get('binary_otsu', lambda: cv2.threshold(
+            self.gray, ColorGray.BLACK.value, ColorGray.WHITE.value,
+            cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU
+        )[1])
+
+    @property
+    def binary_adaptive(self):
+        """Inverted binary image, adaptive gaussian threshold.
+
+        Returns:
+            numpy.ndarray: Binary image, white for dark source pixels.
+        """
+        return self._get('binary_adaptive', lambda: cv2.adaptiveThreshold(
+            self.gray, ColorGray.WHITE.value, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+            cv2.THRESH_BINARY_INV, 11, 2
+        ))
+
+    def opened(self, source, kernel_size, iterations=1):
+        """Morphological opening of a binary image with rectangular kernel.
+
+        Args:
+            source (str): 'binary_otsu' or 'binary_adaptive'.
+            kernel_size (tuple): Kernel (width, height).
+            iterations (int): Number of opening iterations.
+
+        Returns:
+            numpy.ndarray: Opened image.
+        """
+        def compute():
+            kernel = cv2.getStructuringElement(cv2.MORPH_RECT, kernel_size)
+            return cv2.morphologyEx(
+                getattr(self, source), cv2.MORPH_OPEN, kernel,
+                iterations=iterations)
+
+        return self._get(('opened', source, kernel_size, iterations), compute)
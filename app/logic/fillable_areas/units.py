@@ -0,0 +1,32 @@
+"""Conversion of physical lengths to pixels of the rendered page."""
+
+# Pdf user space unit, 1/72 inch
+POINTS_PER_INCH = 72
+# Resolution pages are rendered at unless specified
+REFERENCE_DPI = 300
+
+
+def to_pixels(points, dpi):
+    """Convert length to pixels at the given resolution.
+
+    Args:
+        points (float): Length in points.
+        dpi (int): Render resolution.
+
+    Returns:
+        int: Length in pixels, at least 1.
+    """
+    return max(1, round(points * dpi / POINTS_PER_INCH))
+
+
+def to_odd_pixels(points, dpi):
+    """Convert length to odd number of pixels, e.g. for blur kernels.
+
+    Args:
+        points (float): Length in points.
+        dpi (int): Render resolution.
+
+    Returns:
+        int: Length in pixels, rounded up to odd number.
+    """
+    return to_pixels(points, dpi) | 1
@@ -0,0 +1,264 @@
+"""Logic for getting fillable areas from vector page content.
+
+Born-digital pages draw their lines and boxes as paths, so the areas
+which image detectors recover with morphology are computed from the
+path geometry directly, without rendering the page. Empty regions
+still need the rendered image, so pages are rendered for them when
+DETECT_EMPTY_REGIONS is on. Boxes are x1, y1, x2, y2 pixels of the
+page at the given resolution, x2 and y2 exclusive.
+"""
+
+import numpy as np
+
+from app.logic.fillable_areas.checkbox_areas import (
+    KERNEL_LENGTH as CHECKBOX_KERNEL_LENGTH,
+    MAX_SIDE_LENGTH,
+    MIN_SIDE_LENGTH,
+    filter_checkbox_candidates,
+)
+from app.logic.fillable_areas.geometry.shapes import RectArray
+from app.logic.fillable_areas.horizonal_line_areas import (
+    HORIZONTAL_KERNEL_LENGTH,
+    MARGIN,
+    TABLE_KERNEL_LENGTH,
+    TABLE_MIN_SIDE_LENGTH,
+    TOLERANCE,
+    VERTICAL_KERNEL_LENGTH,
+    find_areas_above_lines,
+    split_lines_by_table_grid,
+)
+from app.logic.fillable_areas.units import to_pixels
+
+# Max size of boxes x boxes matrix processed at once
+CHUNK_CELLS = 1_000_000
+
+
+def find_vector_line_areas(shape, strokes, obstacles, fillable_area_limits, dpi):
+    """Find fillable areas based on horizontal strokes.
+
+    Strokes pass the same length thresholds as the morphological
+    opening of find_line_fillable_areas, touching strokes are merged
+    like contours of the opened image.
+
+    Args:
+        shape (tuple): Page height and width in pixels.
+        strokes (numpy.ndarray): (N, 4) boxes of axis-aligned strokes and
+            filled rectangles.
+        obstacles (numpy.ndarray): (M, 4) boxes of everything drawn on
+            the page, strokes included.
+        fillable_area_limits (dict): Dimension limits for fillable areas.
+        dpi (int): Resolution of the pixel coordinates.
+
+    Returns:
+        shapes.RectArray: Fillable areas above horizontal lines.
+    """
+    horizontal = _find_runs(strokes, _opened_length(HORIZONTAL_KERNEL_LENGTH, dpi), axis=0)
+    vertical = _find_runs(strokes, _opened_length(VERTICAL_KERNEL_LENGTH, dpi), axis=1)
+    # order of contours found on image, bottom to top
+    horizontal = horizontal[np.lexsort((-horizontal[:, 0], -horizontal[:, 1]))]
+    # same line coordinates as bounding rectangles of contours
+    lines = split_lines_by_table_grid(
+        horizontal[:, [0, 1, 2, 1]],
+        vertical[:, [2, 1, 2, 3]],
+        fillable_area_limits['table_cell_min_width'],
+        to_pixels(TOLERANCE, dpi),
+    )
+    return _find_fillable_line_areas(
+        shape, lines, obstacles, fillable_area_limits,
+        _find_tables_upper_lines(strokes, dpi), to_pixels(MARGIN, dpi),
+    )
+
+
+def find_vector_checkbox_areas(strokes, dpi):
+    """Find checkboxes as square cells enclosed by strokes.
+
+    Args:
+        strokes (numpy.ndarray): (N, 4) boxes of axis-aligned strokes and
+            filled rectangles.
+        dpi (int): Resolution of the pixel coordinates.
+
+    Returns:
+        shapes.RectArray: Checkbox interiors, top to bottom.
+    """
+    kernel_length = to_pixels(CHECKBOX_KERNEL_LENGTH, dpi)
+    min_side_length = to_pixels(MIN_SIDE_LENGTH, dpi)
+    max_side_length = to_pixels(MAX_SIDE_LENGTH, dpi)
+    horizontal = _find_runs(strokes, kernel_length, axis=0)
+    vertical = _find_runs(strokes, kernel_length, axis=1)
+    horizontal = horizontal[np.argsort(horizontal[:, 1], kind='stable')]
+    vertical = vertical[np.argsort(vertical[:, 0], kind='stable')]
+
+    cells = []
+    for top_index, top in enumerate(horizontal):
+        below = horizontal[top_index + 1:]
+        gaps = below[:, 1] - top[3]
+        candidates = below[
+            (min_side_length <= gaps) & (gaps <= max_side_length)
+            & (below[:, 0] < top[2]) & (top[0] < below[:, 2])
+        ]
+        for bottom in candidates:
+            cells += _find_cells_between(top, bottom, horizontal, vertical)
+
+    if not cells:
+        return RectArray()
+    x1, y1, x2, y2 = np.unique(np.array(cells, dtype=np.int64), axis=0).T
+    stats = np.column_stack([x1, y1, x2 - x1, y2 - y1, (x2 - x1) * (y2 - y1)])
+    boxes = filter_checkbox_candidates(stats, min_side_length, max_side_length)
+    # connected components order
+    return RectArray(boxes[np.lexsort((boxes[:, 0], boxes[:, 1]))])
+
+
+def _find_cells_between(top, bottom, horizontal, vertical):
+    """Find cells closed by top and bottom strokes and vertical strokes.
+
+    Returns:
+        list: x1, y1, x2, y2 interiors of the cells.
+    """
+    x1, x2 = max(top[0], bottom[0]), min(top[2], bottom[2])
+    sides = vertical[
+        (vertical[:, 1] <= top[3]) & (vertical[:, 3] >= bottom[1])
+        & (vertical[:, 2] > x1) & (vertical[:, 0] < x2)
+    ]
+    cells = []
+    for left, right in zip(sides[:-1], sides[1:]):
+        cell = (left[2], top[3], right[0], bottom[1])
+        if cell[2] <= cell[0]:
+            continue
+        # nearest bottom stroke only, taller cells are split by others
+        between = horizontal[
+            (horizontal[:, 1] >= top[3]) & (horizontal[:, 1] < bottom[1])
+            & (horizontal[:, 0] < cell[2]) & (horizontal[:, 2] > cell[0])
+        ]
+        if not len(between):
+            cells.append(cell)
+    return cells
+
+
+def _opened_length(points, dpi, iterations=2):
+    """Min run length kept by repeated opening with a line kernel."""
+    return iterations * (to_pixels(points, dpi) - 1) + 1
+
+
+def _find_runs(strokes, min_length, axis):
+    """Find strokes which survive opening with a line kernel.
+
+    Touching strokes along the axis, e.g. underscore glyphs of one run,
+    make a single run, strokes across it are cut off by the kernel.
+
+    Args:
+        strokes (numpy.ndarray): (N, 4) x1, y1, x2, y2 boxes.
+        min_length (int): Min run length in pixels.
+        axis (int): 0 - horizontal runs, 1 - vertical runs.
+
+    Returns:
+        numpy.ndarray: (K, 4) boxes of the runs.
+    """
+    lengths = strokes[:, 2 + axis] - strokes[:, axis]
+    thicknesses = strokes[:, 3 - axis] - strokes[:, 1 - axis]
+    runs = _merge_touching(strokes[(lengths >= thicknesses) | (lengths >= min_length)])
+    return runs[runs[:, 2 + axis] - runs[:, axis] >= min_length]
+
+
+def _merge_touching(boxes):
+    """Replace groups of touching boxes with their bounding boxes.
+
+    Boxes are touching when their pixels are 8-connected.
+
+    Args:
+        boxes (numpy.ndarray): (N, 4) x1, y1, x2, y2 boxes.
+
+    Returns:
+        numpy.ndarray: (K, 4) bounding boxes, in order of first box of
+            each group.
+    """
+    if len(boxes) < 2:
+        return boxes
+    parents = list(range(len(boxes)))
+
+    def find(index):
+        while parents[index] != index:
+            parents[index] = parents[parents[index]]
+            index = parents[index]
+        return index
+
+    chunk = max(1, CHUNK_CELLS // len(boxes))
+    for start in range(0, len(boxes), chunk):
+        part = boxes[start:start + chunk]
+        touching = (
+            (part[:, [0]] <= boxes[:, 2]) & (boxes[:, 0] <= part[:, [2]])
+            & (part[:, [1]] <= boxes[:, 3]) & (boxes[:, 1] <= part[:, [3]])
+        )
+        for row, column in zip(*np.nonzero(touching)):
+            first, second = find(row + start), find(column)
+            if first != second:
+                parents[max(first, second)] = min(first, second)
+
+    groups = np.array([find(index) for index in range(len(boxes))])
+    roots, groups = np.unique(groups, return_inverse=True)
+    merged = np.empty((len(roots), 4), dtype=np.int64)
+    merged[:, :2] = np.iinfo(np.int64).max
+    merged[:, 2:] = np.iinfo(np.int64).min
+    np.minimum.at(merged[:, 0], groups, boxes[:, 0])
+    np.minimum.at(merged[:, 1], groups, boxes[:, 1])
+    np.maximum.at(merged[:, 2], groups, boxes[:, 2])
+    np.maximum.at(merged[:, 3], groups, boxes[:, 3])
+    return merged
+
+
+def _find_tables_upper_lines(strokes, dpi):
+    """Find upper line of the largest table, like the image detector."""
+    kernel_length = _opened_length(TABLE_KERNEL_LENGTH, dpi)
+    grid = _merge_touching(np.concatenate([
+        _find_runs(strokes, kernel_length, axis=0),
+        _find_runs(strokes, kernel_length, axis=1),
+    ]))
+    if not len(grid):
+        return []
+    widths, heights = grid[:, 2] - grid[:, 0], grid[:, 3] - grid[:, 1]
+    largest = np.argmax(widths * heights)
+    min_side_length = to_pixels(TABLE_MIN_SIDE_LENGTH, dpi)
+    if heights[largest] > min_side_length and widths[largest] > min_side_length:
+        x1, y1, x2, _ = grid[largest].tolist()
+        return [(x1, y1, x2, y1)]
+    return []
+
+
+def _find_fillable_line_areas(shape, lines, obstacles, fillable_area_limits, tables_upper_borders, margin):
+    """Find fillable areas above all lines at once.
+
+    Clear height above each line is the distance to the nearest
+    obstacle above it within the line width.
+
+    Args:
+        shape (tuple): Page height and width in pixels.
+        lines (shapes.RectArray): Horizontal lines.
+        obstacles (numpy.ndarray): (M, 4) boxes of everything drawn.
+        fillable_area_limits (dict): Dimension limits for fillable areas.
+        tables_upper_borders (list): Upper borders of tables, lines on
+            them are not fillable.
+        margin (int): Pixels cut from both ends of each line.
+
+    Returns:
+        shapes.RectArray: Fillable areas of suitable lines.
+    """
+    def measure_clear_height(y, columns_start, columns_end, max_height):
+        # rows above the page top are blocked
+        clear_height = np.minimum(y, max_height)
+        chunk = max(1, CHUNK_CELLS // max(1, len(obstacles)))
+        for start in range(0, len(y), chunk):
+            end = start + chunk
+            blocking = (
+                (obstacles[:, 1] < y[start:end, None])
+                & (obstacles[:, 0] < columns_end[start:end, None])
+                & (obstacles[:, 2] > columns_start[start:end, None])
+            )
+            gaps = np.where(
+                blocking, np.maximum(y[start:end, None] - obstacles[:, 3], 0), max_height)
+            clear_height[start:end] = np.minimum(
+                clear_height[start:end], gaps.min(axis=1, initial=max_height))
+        return clear_height
+
+    return find_areas_above_lines(
+        lines, shape[1], fillable_area_limits, tables_upper_borders, margin,
+        measure_clear_height,
+    )
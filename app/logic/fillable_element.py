@@ -28,6 +28,10 @@ class FillableElement:
         y2 (float): coordinate
     """
 
+    # Serialization order of the attributes
+    FIELDS = ('x1', 'y1', 'x2', 'y2', 'obj_type', 'name', 'value', 'page_number')
+    __slots__ = FIELDS
+
     _TYPES_MAP = {
         'Tx': 'TEXT',
         'Sig': 'SIGNATURE'
@@ -43,6 +47,13 @@ class FillableElement:
         self.value = value
         self.page_number = page_number
 
+    def to_dict(self):
+        """
+        Returns:
+            dict: Attributes in FIELDS order
+        """
+        return {field: getattr(self, field) for field in self.FIELDS}
+
 
     @classmethod
     def create_from_field_obj(cls, field_obj, media_box, page_number):
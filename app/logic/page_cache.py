@@ -0,0 +1,174 @@
+"""Cache of CV detection results by page content"""
+from collections import OrderedDict
+import hashlib
+import threading
+
+from pdfminer.pdftypes import PDFObjRef, PDFStream, resolve1
+
+from app.logic.constants import PAGE_CACHE_SIZE
+from app.logic.document_page import DocumentPage
+
+# Page attributes that change rendered image
+_PAGE_KEYS = ('Contents', 'Resources', 'MediaBox', 'CropBox', 'Rotate', 'Annots')
+# Annotation attributes that don't change rendered image: links to
+# the page, parent field and popup, name and modification dates
+_ANNOTATION_SKIPPED_KEYS = ('P', 'Parent', 'Popup', 'NM', 'M', 'CreationDate')
+# FillableElement fields stored in cache, page_number depends on document
+_ELEMENT_FIELDS = ('x1', 'y1', 'x2', 'y2', 'obj_type', 'name', 'value')
+
+
+class PageFingerprinter:
+    """Hashes of everything that is rendered on pages of one document
+    Equal pages of different documents (e.g. the same disclosure page
+    in different packets) get the same fingerprint, even if their object
+    numbers differ. Each indirect object is hashed once per document,
+    so resources shared by pages (fonts, images) are not hashed again
+    for every page. Streams are hashed as stored, without decoding.
+    """
+    def __init__(self):
+        # digests of indirect objects by object number
+        self._digests = {}
+        # object numbers being hashed, for reference cycles
+        self._stack = []
+
+    def fingerprint(self, page):
+        """
+        Args:
+            page (pdfminer.pdfpage.PDFPage)
+        Returns:
+            str: sha256 hex digest
+        """
+        digest = hashlib.sha256()
+        for key in _PAGE_KEYS:
+            digest.update(key.encode())
+            # inherited attributes are copied into pages by pdfminer
+            value = page.attrs.get(key)
+            if key == 'Annots':
+                # annotation appearances are rendered on the page
+                value = [_rendered_annotation(annotation) for annotation in resolve1(value) or []]
+            self._hash_object(value, digest)
+        return digest.hexdigest()
+
+    def _hash_object(self, obj, digest):
+        """Feed pdf object into digest, indirect objects by their digests
+        Args:
+            obj: pdfminer object (PDFObjRef, PDFStream, dict, list or scalar)
+            digest (hashlib.sha256)
+        """
+        if isinstance(obj, PDFObjRef):
+            digest.update(b'R')
+            digest.update(self._object_digest(obj))
+        elif isinstance(obj, PDFStream):
+            self._hash_object(obj.attrs, digest)
+            # stream is decoded already when its page was processed
+            if obj.rawdata is not None:
+                digest.update(b'stream')
+                digest.update(obj.rawdata)
+            else:
+                digest.update(b'decoded')
+                digest.update(obj.get_data())
+        elif isinstance(obj, dict):
+            digest.update(b'<<')
+            for key in sorted(obj):
+                digest.update(str(key).encode())
+                self._hash_object(obj[key] if key != 'Parent' else None, digest)
+            digest.update(b'>>')
+        elif isinstance(obj, list):
+            digest.update(b'[')
+            for item in obj:
+                self._hash_object(item, digest)
+            digest.update(b']')
+        else:
+            digest.update(repr(obj).encode())
+            digest.update(b' ')
+
+    def _object_digest(self, ref):
+        """
+        Args:
+            ref (pdfminer.pdftypes.PDFObjRef)
+        Returns:
+            bytes: sha256 digest of referenced object
+        """
+        objid = ref.objid
+        if objid in self._digests:
+            return self._digests[objid]
+        if objid in self._stack:
+            # cycle, referenced by distance to the object being hashed
+            return b'C%d' % (len(self._stack) - self._stack.index(objid))
+
+        self._stack.append(objid)
+        try:
+            digest = hashlib.sha256()
+            self._hash_object(ref.resolve(), digest)
+        finally:
+            self._stack.pop()
+        self._digests[objid] = digest.digest()
+        return self._digests[objid]
+
+
+def _rendered_annotation(annotation):
+    """Annotation attributes which change rendered image
+    Args:
+        annotation: pdfminer annotation object or reference
+    Returns:
+        dict
+    """
+    annotation = resolve1(annotation)
+    if not isinstance(annotation, dict):
+        return {}
+    return {key: value for key, value in annotation.items() if key not in _ANNOTATION_SKIPPED_KEYS}
+
+
+class PageResultCache:
+    """In-memory LRU of detected page elements by PageFingerprinter.fingerprint()
+    Attributes:
+        size (int): Max number of pages, 0 - disabled
+    """
+    def __init__(self, size=PAGE_CACHE_SIZE):
+        """
+        Attributes:
+            size (int): Max number of pages, 0 - disabled
+        """
+        self.size = size
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, fingerprint, page_num):
+        """
+        Args:
+            fingerprint (str): PageFingerprinter.fingerprint()
+            page_num (int): Number of the page in current document
+        Returns:
+            logic.classes.DocumentPage|None
+        """
+        with self._lock:
+            elements = self._pages.get(fingerprint)
+            if elements is None:
+                return None
+            self._pages.move_to_end(fingerprint)
+
+        doc_page = DocumentPage(page_num, None)
+        for element in elements:
+            doc_page.add_element(**dict(zip(_ELEMENT_FIELDS, element)))
+        return doc_page
+
+    def put(self, fingerprint, doc_page):
+        """
+        Args:
+            fingerprint (str): PageFingerprinter.fingerprint()
+            doc_page (logic.classes.DocumentPage)
+        """
+        if not self.size:
+            return
+        elements = tuple(
+            tuple(getattr(element, field) for field in _ELEMENT_FIELDS)
+            for element in doc_page.fillable_elements
+        )
+        with self._lock:
+            self._pages[fingerprint] = elements
+            self._pages.move_to_end(fingerprint)
+            while len(self._pages) > self.size:
+                self._pages.popitem(last=False)
+
+
+page_result_cache = PageResultCache()
@@ -0,0 +1,282 @@
+"""Vector content of pdf pages for detection without rendering"""
+import math
+from numbers import Number
+
+import numpy
+from pdfminer.converter import PDFPageAggregator
+from pdfminer.layout import LTChar, LTCurve, LTImage, LTLayoutContainer, LTRect
+from pdfminer.pdffont import PDFType3Font
+from pdfminer.pdfinterp import PDFPageInterpreter
+from pdfminer.pdftypes import resolve1
+
+from app.logic.constants import PDF_DOCUMENT_SIZE
+from app.logic.text_processing import OCR_DATA_KEYS
+
+# Pages with larger images are scans, they are detected on rendered image
+MAX_IMAGE_PAGE_FRACTION = 0.1
+# Pages with more strokes are drawings rather than forms
+MAX_STROKES = 5000
+# Glyphs drawn as lines
+UNDERSCORES = '_＿'
+# Fonts and characters which can draw boxes or lines not known from text
+SYMBOLIC_FONT_NAMES = ('dingbat', 'wingding', 'webding', 'symbol')
+BOX_CHAR_RANGES = (
+    ('─', '◿'),  # box drawing, block elements, geometric shapes
+    ('☐', '☒'),  # ballot boxes
+    ('✀', '➿'),  # dingbats
+)
+# Annotations without appearance on the page
+INVISIBLE_ANNOTATIONS = ('Link', 'Popup')
+# Colors lighter than this are background after binarization
+DARK_LUMINANCE = 0.5
+# Underscore glyph position below baseline, in font sizes
+UNDERSCORE_TOP = 0.1
+UNDERSCORE_THICKNESS = 0.05
+# Gap between characters of different words, in font sizes
+WORD_GAP = 0.25
+
+
+class PageGeometry:
+    """Page content found without rendering, in PDF_DOCUMENT_SIZE pixels
+    Boxes are (x1, y1, x2, y2) with exclusive x2 and y2.
+    Attributes:
+        shape (tuple<int, int>): Page height and width
+        strokes (numpy.ndarray): (N, 4) boxes of dark axis-aligned
+            strokes, filled rectangles and underscores
+        obstacles (numpy.ndarray): (M, 4) boxes of everything drawn,
+            strokes included
+        words (dict): Text layer in pytesseract.image_to_data format
+    """
+    def __init__(self, shape, strokes, obstacles, words):
+        """
+        Attributes:
+            shape (tuple<int, int>): Page height and width
+            strokes (numpy.ndarray): (N, 4) boxes of dark axis-aligned
+                strokes, filled rectangles and underscores
+            obstacles (numpy.ndarray): (M, 4) boxes of everything drawn,
+                strokes included
+            words (dict): Text layer in pytesseract.image_to_data format
+        """
+        self.shape = shape
+        self.strokes = strokes
+        self.obstacles = obstacles
+        self.words = words
+
+
+def extract_page_geometry(page, resource_manager):
+    """Read lines, boxes and words of born-digital page
+    Args:
+        page (pdfminer.pdfpage.PDFPage)
+        resource_manager (pdfminer.pdfinterp.PDFResourceManager)
+    Returns:
+        PageGeometry|None: None when page has to be rendered: scanned
+            pages, annotations, text which glyphs are unknown (Type3 and
+            symbolic fonts, characters without unicode) and too complex
+            drawings
+    """
+    for annotation in resolve1(page.annots) or []:
+        annotation = resolve1(annotation)
+        if getattr(annotation.get('Subtype'), 'name', None) not in INVISIBLE_ANNOTATIONS:
+            return None
+
+    device = _GeometryAggregator(resource_manager)
+    PDFPageInterpreter(resource_manager, device).process_page(page)
+    if device.unsupported:
+        return None
+
+    layout = device.get_result()
+    builder = _GeometryBuilder(layout)
+    if not builder.add_items(layout) or len(builder.strokes) > MAX_STROKES:
+        return None
+    return builder.build()
+
+
+class _GeometryAggregator(PDFPageAggregator):
+    """Page layout without text analysis, marks glyphs unknown from text"""
+    def __init__(self, resource_manager):
+        super().__init__(resource_manager, laparams=None)
+        self.unsupported = False
+
+    def render_char(self, matrix, font, fontsize, scaling, rise, cid, ncs, graphicstate):
+        fontname = str(font.fontname).lower()
+        if isinstance(font, PDFType3Font) or any(name in fontname for name in SYMBOLIC_FONT_NAMES):
+            self.unsupported = True
+        return super().render_char(matrix, font, fontsize, scaling, rise, cid, ncs, graphicstate)
+
+    def handle_undefined_char(self, font, cid):
+        self.unsupported = True
+        return super().handle_undefined_char(font, cid)
+
+    def paint_path(self, gstate, stroke, fill, evenodd, path):
+        # line width is in user space, paths are in page space
+        gstate = gstate.copy()
+        a, b, c, d, _, _ = self.ctm
+        gstate.linewidth *= math.sqrt(abs(a * d - b * c))
+        super().paint_path(gstate, stroke, fill, evenodd, path)
+
+
+class _GeometryBuilder:
+    """Collects layout items as pixel boxes"""
+    def __init__(self, layout):
+        self.scale = PDF_DOCUMENT_SIZE / 72
+        self.left = layout.x0
+        self.top = layout.y1
+        self.page_area = layout.width * layout.height
+        self.shape = (round(layout.height * self.scale), round(layout.width * self.scale))
+        self.strokes = []
+        self.obstacles = []
+        self.words = {key: [] for key in OCR_DATA_KEYS}
+        self._word = []
+        self._last_char = None
+
+    def add_items(self, container):
+        """
+        Returns:
+            bool: False when page has to be rendered
+        """
+        for item in container:
+            if isinstance(item, LTChar):
+                if not self._add_char(item):
+                    return False
+            elif isinstance(item, LTCurve):
+                self._add_path(item)
+            elif isinstance(item, LTImage):
+                if item.width * item.height > self.page_area * MAX_IMAGE_PAGE_FRACTION:
+                    return False
+                self.obstacles.append(self._box(item.bbox))
+            elif isinstance(item, LTLayoutContainer):
+                # form XObjects and inline images
+                if not self.add_items(item):
+                    return False
+        return True
+
+    def build(self):
+        self._end_word()
+        strokes = numpy.array(self.strokes, dtype=numpy.int64).reshape(-1, 4)
+        obstacles = numpy.array(self.obstacles, dtype=numpy.int64).reshape(-1, 4)
+        return PageGeometry(
+            self.shape, strokes, numpy.concatenate([strokes, obstacles]), self.words
+        )
+
+    def _add_char(self, char):
+        text = char.get_text()
+        if any(start <= symbol <= end for symbol in text for start, end in BOX_CHAR_RANGES):
+            return False
+        if not text.strip():
+            self._end_word()
+            return True
+
+        _, b, c, _, _, baseline = char.matrix
+        horizontal = char.upright and b == 0 and c == 0
+        if text in UNDERSCORES:
+            self._end_word()
+            if horizontal:
+                top = baseline - UNDERSCORE_TOP * char.size
+                self.strokes.append(self._box(
+                    (char.x0, top - UNDERSCORE_THICKNESS * char.size, char.x1, top)
+                ))
+            else:
+                self.obstacles.append(self._box(char.bbox))
+            return True
+
+        # glyphs are above baseline, descenders are ignored
+        self.obstacles.append(self._box(
+            (char.x0, max(char.y0, baseline), char.x1, char.y1) if horizontal else char.bbox
+        ))
+        last = self._last_char
+        if last is not None and (
+                abs(char.y0 - last.y0) > char.size / 2
+                or char.x0 < last.x1 - char.size / 2
+                or char.x0 - last.x1 > char.size * WORD_GAP
+        ):
+            self._end_word()
+        self._word.append((text, self._box(char.bbox)))
+        self._last_char = char
+        return True
+
+    def _end_word(self):
+        if self._word:
+            x1 = min(box[0] for _, box in self._word)
+            y1 = min(box[1] for _, box in self._word)
+            x2 = max(box[2] for _, box in self._word)
+            y2 = max(box[3] for _, box in self._word)
+            text = ''.join(text for text, _ in self._word)
+            for key, value in zip(OCR_DATA_KEYS, (text, x1, y1, x2 - x1, y2 - y1, 100)):
+                self.words[key].append(value)
+        self._word = []
+        self._last_char = None
+
+    def _add_path(self, path):
+        if path.fill and _is_dark(path.non_stroking_color):
+            if isinstance(path, LTRect):
+                # filled rectangle is a thick stroke
+                self.strokes.append(self._box(path.bbox))
+            else:
+                self.obstacles.append(self._box(path.bbox))
+        if not path.stroke or not _is_dark(path.stroking_color):
+            return
+        if path.dashing_style and path.dashing_style[0]:
+            # dashes are too short for lines
+            self.obstacles.append(self._box(path.bbox))
+            return
+
+        half_width = path.linewidth / 2
+        start = current = None
+        for operator, *points in path.original_path or ():
+            if operator == 'm':
+                start = current = points[-1]
+                continue
+            if current is None:
+                continue
+            end = points[-1] if operator != 'h' else start
+            if operator in ('l', 'h'):
+                self._add_segment(current, end, half_width)
+            else:
+                # bezier curve
+                xs, ys = zip(current, *points)
+                self.obstacles.append(self._box((min(xs), min(ys), max(xs), max(ys))))
+            current = end
+
+    def _add_segment(self, start, end, half_width):
+        (x0, y0), (x1, y1) = start, end
+        x0, x1 = sorted((x0, x1))
+        y0, y1 = sorted((y0, y1))
+        if y1 - y0 < 0.01 and x1 - x0 >= 0.01:
+            self.strokes.append(self._box((x0, y0 - half_width, x1, y1 + half_width)))
+        elif x1 - x0 < 0.01 and y1 - y0 >= 0.01:
+            self.strokes.append(self._box((x0 - half_width, y0, x1 + half_width, y1)))
+        elif x1 - x0 >= 0.01:
+            # diagonal lines are not found on image either
+            self.obstacles.append(self._box((x0, y0, x1, y1)))
+
+    def _box(self, bbox):
+        """Pdf (x0, y0, x1, y1) to pixels (x1, y1, x2, y2), at least one pixel"""
+        x0, y0, x1, y1 = bbox
+        left = round((x0 - self.left) * self.scale)
+        top = round((self.top - y1) * self.scale)
+        right = max(round((x1 - self.left) * self.scale), left + 1)
+        bottom = max(round((self.top - y0) * self.scale), top + 1)
+        return left, top, right, bottom
+
+
+def _is_dark(color):
+    """Whether color is foreground after binarization, unknown colors are
+    Args:
+        color: pdfminer color, gray, RGB or CMYK components
+    Returns:
+        bool
+    """
+    if isinstance(color, Number):
+        color = (color,)
+    if not isinstance(color, (tuple, list)) or not all(isinstance(value, Number) for value in color):
+        return True
+    if len(color) == 1:
+        luminance = color[0]
+    elif len(color) == 3:
+        luminance = 0.299 * color[0] + 0.587 * color[1] + 0.114 * color[2]
+    elif len(color) == 4:
+        cyan, magenta, yellow, black = color
+        luminance = (1 - black) * (1 - (0.299 * cyan + 0.587 * magenta + 0.114 * yellow))
+    else:
+        return True
+    return luminance < DARK_LUMINANCE
@@ -0,0 +1,97 @@
+"""Rendering pdf pages to images"""
+import re
+import subprocess
+
+import numpy
+
+from app.logic.constants import PDF_DOCUMENT_SIZE
+from app.logic.exceptions import PageRenderError
+
+# Binary PGM header: magic, width, height, max gray value, single whitespace
+_PGM_HEADER = re.compile(rb'P5\s+(\d+)\s+(\d+)\s+(\d+)\s')
+
+
+def render_page_gray(pdf_bytes, page_num, dpi=PDF_DOCUMENT_SIZE):
+    """Render single page straight to 8-bit grayscale
+    pdftoppm writes PGM to stdout, pixels are wrapped into ndarray without
+    copying and without RGB decode or color conversion.
+    Args:
+        pdf_bytes (bytes): Source pdf document
+        page_num (int): Zero-based page number
+        dpi (int): Rendering resolution
+    Returns:
+        numpy.ndarray: (height, width) uint8 read-only image
+    Raises:
+        logic.exceptions.PageRenderError
+    """
+    page = str(page_num + 1)
+    process = subprocess.run(
+        ['pdftoppm', '-r', str(dpi), '-f', page, '-l', page, '-gray', '-'],
+        input=pdf_bytes,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    header = _PGM_HEADER.match(process.stdout)
+    if process.returncode != 0 or not header:
+        raise PageRenderError(process.stderr.decode(errors='replace'))
+    width, height, max_value = (int(value) for value in header.groups())
+    if max_value != 255:
+        raise PageRenderError(f'unsupported max gray value {max_value}')
+    return numpy.frombuffer(
+        process.stdout, dtype=numpy.uint8, count=width * height, offset=header.end()
+    ).reshape(height, width)
+
+
+class PageRasterCache:
+    """Per-request storage of rendered pdf pages
+    Each page is rendered only on first access, so CV detection and
+    debug output share a single pdftoppm run per page.
+    Attributes:
+        dpi (int): Rendering resolution
+        pdf_bytes (bytes): Source pdf document
+        _images (dict): Rendered grayscale numpy.ndarray by page number
+    """
+    def __init__(self, pdf_bytes, dpi=PDF_DOCUMENT_SIZE):
+        """
+        Attributes:
+            pdf_bytes (bytes): Source pdf document
+            dpi (int): Rendering resolution
+        """
+        self.dpi = dpi
+        self.pdf_bytes = pdf_bytes
+        self._images = {}
+
+    def get(self, page_num):
+        """Get rendered page, render it if needed
+        Args:
+            page_num (int): Zero-based page number
+        Returns:
+            numpy.ndarray: Grayscale read-only image, see render_page_gray
+        """
+        if page_num not in self._images:
+            self._images[page_num] = render_page_gray(self.pdf_bytes, page_num, self.dpi)
+        return self._images[page_num]
+
+    def put(self, page_num, image):
+        """Store page rendered elsewhere (e.g. in a worker process)
+        Args:
+            page_num (int): Zero-based page number
+            image (numpy.ndarray): Rendered page
+        """
+        self._images[page_num] = image
+
+    def pop(self, page_num):
+        """Take rendered page out of the cache, without rendering it
+        Args:
+            page_num (int): Zero-based page number
+        Returns:
+            numpy.ndarray|None: None when page wasn't rendered
+        """
+        return self._images.pop(page_num, None)
+
+    def release(self, page_num):
+        """Drop rendered page from the cache
+        Args:
+            page_num (int): Zero-based page number
+        """
+        self._images.pop(page_num, None)
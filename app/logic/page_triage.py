@@ -0,0 +1,107 @@
+"""Pre-raster check whether page can contain fillable lines or boxes"""
+import re
+
+from pdfminer.pdftypes import PDFStream, resolve1
+
+
+def _operators(*names):
+    """Regex of content stream operators
+    Operator tokens are delimited by whitespace or by the end of the
+    previous operand. Matches inside strings are possible, which only
+    makes the check more conservative.
+    """
+    return re.compile(rb'(?<![^\s\])>}])(?:%s)(?![^\s(<\[{/%%])' % b'|'.join(names))
+
+
+# Operators that draw something besides text: path construction (every
+# stroked or filled path starts with one of them), XObjects, inline
+# images and shadings
+_DRAWING_OPERATORS = _operators(b're', b'm', b'Do', b'BI', b'sh')
+_TEXT_OBJECT_OPERATOR = _operators(b'BT')
+# Hex strings, but not dictionaries
+_HEX_STRING = re.compile(rb'<([0-9A-Fa-f\s]*)>')
+# Fonts and encodings where text codes are latin characters,
+# so the only glyph that can draw a line is underscore (0x5F)
+_SIMPLE_FONT_TYPES = ('Type1', 'MMType1', 'TrueType')
+_SYMBOLIC_FONTS = ('Symbol', 'ZapfDingbats')
+_STANDARD_ENCODINGS = ('StandardEncoding', 'WinAnsiEncoding', 'MacRomanEncoding')
+# FontDescriptor /Flags bit of fonts with non-latin glyphs
+_SYMBOLIC_FLAG = 1 << 2
+
+
+def page_may_have_fields(page):
+    """Whether CV detection can find lines or checkboxes on the page
+    Pages with text only (e.g. terms and conditions) can't: lines and
+    boxes are drawn as paths, images or annotations, or typed as
+    underscores. The check is conservative, anything that can't be
+    proved text-only is reported as possibly having fields.
+    Args:
+        page (pdfminer.pdfpage.PDFPage)
+    Returns:
+        bool
+    """
+    try:
+        if page.attrs.get('Annots'):
+            # annotation appearances are rendered on the page
+            return True
+        data = b''.join(
+            stream.get_data() for stream in map(resolve1, page.contents or [])
+            if isinstance(stream, PDFStream)
+        )
+        if _DRAWING_OPERATORS.search(data):
+            return True
+        if not _TEXT_OBJECT_OPERATOR.search(data):
+            return False
+        if b'_' in data or b'\\137' in data or _has_hex_underscore(data):
+            return True
+        return not _has_latin_fonts(resolve1(page.resources))
+    except Exception:
+        return True
+
+
+def _has_hex_underscore(data):
+    for match in _HEX_STRING.finditer(data):
+        digits = re.sub(rb'\s', b'', match.group(1))
+        # odd last digit is followed by 0
+        if b'_' in bytes.fromhex((digits + b'0' * (len(digits) % 2)).decode()):
+            return True
+    return False
+
+
+def _has_latin_fonts(resources):
+    """Whether all page fonts draw codes as latin characters
+    Composite, Type3, symbolic and embedded fonts with built-in encoding
+    can draw anything, e.g. a checkbox glyph, with any code.
+    Args:
+        resources (dict|None): Page resources
+    Returns:
+        bool
+    """
+    fonts = resolve1(resources.get('Font')) if isinstance(resources, dict) else None
+    if not isinstance(fonts, dict):
+        return True
+    for font in map(resolve1, fonts.values()):
+        if not isinstance(font, dict):
+            return False
+        if getattr(font.get('Subtype'), 'name', None) not in _SIMPLE_FONT_TYPES:
+            return False
+        if getattr(font.get('BaseFont'), 'name', None) in _SYMBOLIC_FONTS:
+            return False
+        descriptor = resolve1(font.get('FontDescriptor'))
+        if isinstance(descriptor, dict) and resolve1(descriptor.get('Flags', 0)) & _SYMBOLIC_FLAG:
+            return False
+
+        encoding = resolve1(font.get('Encoding'))
+        if isinstance(encoding, dict):
+            differences = resolve1(encoding.get('Differences')) or []
+            if any(getattr(item, 'name', None) == 'underscore' for item in differences):
+                return False
+            encoding = encoding.get('BaseEncoding')
+        if encoding is None:
+            if descriptor is None:
+                # standard 14 font, not embedded
+                continue
+            return False
+        if getattr(encoding, 'name', None) not in _STANDARD_ENCODINGS:
+            return False
+    return True
@@ -0,0 +1,145 @@
+"""Pdf document parsed once per request"""
+from io import BytesIO
+
+from pdfminer.pdfdocument import PDFDocument, PDFEncryptionError
+from pdfminer.pdfinterp import PDFResourceManager
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdfparser import PDFParser, PDFSyntaxError
+from pdfminer.pdftypes import PDFObjRef, resolve1
+from werkzeug.exceptions import BadRequest
+
+
+class PdfSource:
+    """Lazily parsed pdf document shared by all detection steps
+    pdfminer parses only xref and trailer up front and resolves other
+    objects on access, so the AcroForm check, widgets extraction and CV
+    detection reuse one parse instead of reading the file again each.
+    Attributes:
+        binary (bytes): Source pdf document
+        _document (pdfminer.pdfdocument.PDFDocument|None)
+        _pages (list<pdfminer.pdfpage.PDFPage>|None)
+        _page_ids (list<int>|None): Page object ids in page order
+        _resource_manager (pdfminer.pdfinterp.PDFResourceManager|None)
+    """
+    def __init__(self, binary):
+        """
+        Attributes:
+            binary (bytes): Source pdf document
+        """
+        self.binary = binary
+        self._document = None
+        self._pages = None
+        self._page_ids = None
+        self._resource_manager = None
+
+    @classmethod
+    def wrap(cls, pdf_binary):
+        """Accept both PdfSource and raw document
+        Args:
+            pdf_binary (PdfSource|io.BytesIO|bytes)
+        Returns:
+            PdfSource
+        """
+        if isinstance(pdf_binary, cls):
+            return pdf_binary
+        if isinstance(pdf_binary, BytesIO):
+            pdf_binary = pdf_binary.getvalue()
+        return cls(pdf_binary)
+
+    @property
+    def document(self):
+        """Parsed document, decrypted with empty password if needed
+        Returns:
+            pdfminer.pdfdocument.PDFDocument
+        Raises:
+            werkzeug.exceptions.BadRequest: when can't read file
+        """
+        if self._document is None:
+            try:
+                self._document = PDFDocument(PDFParser(BytesIO(self.binary)))
+            except PDFEncryptionError as e:
+                raise BadRequest('File is encrypted') from e
+            except PDFSyntaxError as e:
+                raise BadRequest(f'Bad pdf file: {e}') from e
+        return self._document
+
+    @property
+    def has_acroform(self):
+        """Whether document has interactive form
+        Returns:
+            bool
+        """
+        return 'AcroForm' in self.document.catalog
+
+    @property
+    def pages(self):
+        """Document pages with inherited attributes resolved
+        Returns:
+            list<pdfminer.pdfpage.PDFPage>
+        """
+        if self._pages is None:
+            self._pages = list(PDFPage.create_pages(self.document))
+        return self._pages
+
+    @property
+    def page_ids(self):
+        """Page object ids in page order
+        Unlike pages, only page tree nodes are resolved, page contents
+        and resources are left untouched.
+        Returns:
+            list<int>
+        """
+        if self._page_ids is None and self._pages is None:
+            try:
+                self._page_ids = self._walk_page_tree()
+            except KeyError:
+                # broken page tree, pdfminer recovers pages from xref
+                pass
+        if self._page_ids is None:
+            self._page_ids = [page.pageid for page in self.pages]
+        return self._page_ids
+
+    @property
+    def resource_manager(self):
+        """Fonts and other resources shared by all interpreted pages
+        Returns:
+            pdfminer.pdfinterp.PDFResourceManager
+        """
+        if self._resource_manager is None:
+            self._resource_manager = PDFResourceManager()
+        return self._resource_manager
+
+    def get_page_attribute(self, page_id, name):
+        """Page attribute, inherited from page tree if the page has none
+        Args:
+            page_id (int): Page object id
+            name (str): e.g. 'MediaBox'
+        Returns:
+            Resolved attribute value or None
+        """
+        node = self.document.getobj(page_id)
+        visited = set()
+        while isinstance(node, dict) and id(node) not in visited:
+            if name in node:
+                return resolve1(node[name])
+            visited.add(id(node))
+            node = resolve1(node.get('Parent'))
+        return None
+
+    def _walk_page_tree(self):
+        page_ids = []
+        visited = set()
+        stack = [self.document.catalog['Pages']]
+        while stack:
+            ref = stack.pop()
+            if not isinstance(ref, PDFObjRef):
+                raise KeyError('Page tree node is not an indirect object')
+            if ref.objid in visited:
+                continue
+            visited.add(ref.objid)
+            node = resolve1(ref)
+            if 'Kids' in node:
+                stack += reversed(resolve1(node['Kids']))
+            else:
+                page_ids.append(ref.objid)
+        return page_ids
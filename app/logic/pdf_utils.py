@@ -1,155 +1,526 @@
 """Functions for working with pdf documents"""
 import json
-from io import BytesIO
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
 
-import pytesseract
 import os
 if os.getenv('COLAB'):
     from colab.flask import current_app as app
 else:
     from flask import current_app as app
 import cv2
-import numpy
-from pdf2image import convert_from_bytes
 from PIL import Image, ImageDraw
-from PyPDF2 import PdfReader, PdfWriter
 from PyPDF2.errors import PdfReadError
-from pdfminer.pdfpage import PDFPage
-from pdfminer.pdfparser import PDFParser
-from pdfminer.pdfdocument import PDFDocument
-from pdfminer.pdftypes import resolve1
-from pytesseract import Output
-from werkzeug.exceptions import BadRequest
+from pdfminer.pdftypes import PDFObjRef, resolve1
 
 from app.logic.constants import (
+    CV_DETECTION_DPI,
+    CV_PARALLEL_WORKERS,
+    DETECT_EMPTY_REGIONS,
+    PAGE_TRIAGE,
     PDF_DOCUMENT_SIZE,
     RECTANGLES_OUTLINE_COLOR_1,
     RECTANGLES_OUTLINE_COLOR_2,
     RECTANGLES_OUTLINE_WIDTH,
+    VECTOR_DETECTION,
 )
 from app.logic.document_page import DocumentPage
-from app.logic.fillable_areas.fillable_areas import find_fillable_areas
-from app.logic.text_processing import get_field_name, preprocess_image
+from app.logic.fillable_areas.fillable_areas import (
+    find_empty_region_areas,
+    find_fillable_areas,
+    find_vector_fillable_areas,
+)
+from app.logic.fillable_areas.geometry.shapes import RectArray
+from app.logic.fillable_areas.page_context import PageImageContext
+from app.logic.page_cache import PageFingerprinter, page_result_cache
+from app.logic.page_geometry import extract_page_geometry
+from app.logic.page_raster import PageRasterCache
+from app.logic.page_triage import page_may_have_fields
+from app.logic.pdf_source import PdfSource
+from app.logic.text_processing import WordIndex, get_field_name, preprocess_image, recognize_page_text
+
 
+# Field attributes which kids of /Fields tree take from their parents
+INHERITED_FIELD_KEYS = ('FT', 'V', 'TU', 'Ff')
 
-def extract_elements_cv(pdf_binary):
+
+def extract_elements_cv(pdf_binary, raster_cache=None):
     """Find fillable areas with cv2 lib
     Args:
-       pdf_binary (io.BytesIO)
+       pdf_binary (logic.pdf_source.PdfSource|io.BytesIO)
+       raster_cache (logic.page_raster.PageRasterCache|None): Rendered
+           pages shared with other consumers of the same request
     Returns:
         list<logic.classes.DocumentPage>
     """
-    pdf_file = PdfReader(pdf_binary)
+    return list(iter_elements_cv(pdf_binary, raster_cache, keep_rasters=True))
+
+
+def iter_elements_cv(pdf_binary, raster_cache=None, keep_rasters=False, workers=None, page_nums=None):
+    """Find fillable areas with cv2 lib one page at a time
+    Each page is rendered, analyzed and (unless keep_rasters is set)
+    released before the next one, so memory doesn't grow with page count.
+    Pages which can't have lines or checkboxes (see PAGE_TRIAGE) and
+    born-digital pages (see VECTOR_DETECTION) are rendered only when
+    empty regions are detected.
+    Args:
+       pdf_binary (logic.pdf_source.PdfSource|io.BytesIO): PdfSource
+           already parsed by the caller is reused
+       raster_cache (logic.page_raster.PageRasterCache|None): Rendered
+           pages shared with other consumers of the same request
+       keep_rasters (bool): Leave rendered pages in raster_cache,
+           the consumer is responsible for releasing them
+       workers (int|None): Number of processes for page detection,
+           CV_PARALLEL_WORKERS by default. Pages are still yielded in order
+       page_nums (list<int>|None): Ascending numbers of pages to analyze,
+           all pages by default
+    Yields:
+        logic.classes.DocumentPage
+    """
+    source = PdfSource.wrap(pdf_binary)
+    pdf_pages = source.pages
     app.logger.info('--- CV: pdf created ---')
 
-    if pdf_file.is_encrypted:
-        try:
-            pdf_file.decrypt('')
-        except NotImplementedError as e:
-            raise BadRequest('File is encrypted') from e
+    if raster_cache is None:
+        raster_cache = PageRasterCache(source.binary, PDF_DOCUMENT_SIZE)
+    detection_cache = _get_detection_cache(source.binary, raster_cache)
 
-    pages = []
+    if workers is None:
+        workers = CV_PARALLEL_WORKERS
+    if page_nums is None:
+        page_nums = range(len(pdf_pages))
+    # pages are fingerprinted and triaged as they come, not all upfront
+    fingerprinter = PageFingerprinter() if page_result_cache.size else None
+
+    if workers > 1 and len(page_nums) > 1:
+        yield from _iter_elements_cv_parallel(
+            source, page_nums, fingerprinter, raster_cache, keep_rasters, workers
+        )
+        return
 
-    for page_num in range(len(pdf_file.pages)):
-        # if page_num != 0:
-        #     continue
+    for page_num in page_nums:
         app.logger.info(f'--- CV: Page{page_num} ---')
-        page = pdf_file.pages[page_num]
-        doc_page = DocumentPage(page_num, None)
+        fingerprint = _get_page_fingerprint(fingerprinter, pdf_pages[page_num])
+        detect_lines = _triage_page(pdf_pages[page_num])
+        doc_page = _get_known_page(fingerprint, page_num, detect_lines)
+        if doc_page is None:
+            doc_page = _detect_page(page_num, source, raster_cache, detection_cache, detect_lines)
+            app.logger.info(f'--- CV: fillable areas search complete on page {page_num} ---')
+            if fingerprint:
+                page_result_cache.put(fingerprint, doc_page)
+            if not keep_rasters:
+                raster_cache.release(page_num)
+        yield doc_page
+
+
+def _iter_elements_cv_parallel(source, page_nums, fingerprinter, raster_cache, keep_rasters, workers):
+    """Render and analyze not cached pages in a process pool, yield all pages in page order
+    Pages are submitted as soon as they are fingerprinted, finished pages
+    are yielded while later pages are still being submitted. The pool is
+    started only when some page isn't known without rendering.
+    """
+    executor = None
+    # page_num, fingerprint and DocumentPage or Future of worker result
+    pages = deque()
+    try:
+        for page_num in page_nums:
+            fingerprint = _get_page_fingerprint(fingerprinter, source.pages[page_num])
+            detect_lines = _triage_page(source.pages[page_num])
+            doc_page = _get_known_page(fingerprint, page_num, detect_lines)
+            if doc_page is None:
+                if executor is None:
+                    app.logger.info(f'--- CV: pages on {workers} processes ---')
+                    executor = ProcessPoolExecutor(
+                        max_workers=min(workers, len(page_nums)),
+                        initializer=_init_cv_worker,
+                        initargs=(source.binary, raster_cache.dpi, CV_DETECTION_DPI),
+                    )
+                doc_page = executor.submit(_extract_page_elements_cv_worker, page_num, detect_lines, keep_rasters)
+            pages.append((page_num, fingerprint, doc_page))
+            while pages and (not isinstance(pages[0][2], Future) or pages[0][2].done()):
+                yield _finish_parallel_page(*pages.popleft(), raster_cache)
+        while pages:
+            yield _finish_parallel_page(*pages.popleft(), raster_cache)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
 
-        tmp = BytesIO()
-        stream = PdfWriter()
-        stream.add_page(page)
-        stream.write(tmp)
-        page_bytes = tmp.getvalue()
 
-        page_images = convert_from_bytes(page_bytes, PDF_DOCUMENT_SIZE)
-        page_image_converted = page_images[0]
-        cv_image = numpy.array(page_image_converted)
+def _finish_parallel_page(page_num, fingerprint, doc_page, raster_cache):
+    """Take worker result of detected page
+    Returns:
+        logic.classes.DocumentPage
+    """
+    if not isinstance(doc_page, Future):
+        return doc_page
+    doc_page, page_image = doc_page.result()
+    app.logger.info(f'--- CV: fillable areas search complete on page {page_num} ---')
+    if fingerprint:
+        page_result_cache.put(fingerprint, doc_page)
+    if page_image is not None:
+        raster_cache.put(page_num, page_image)
+    return doc_page
 
-        # image = Image.fromarray(cv_image)
-        # image.show()
 
-        fillable_areas = find_fillable_areas(cv_image)
-        app.logger.info(f'--- CV: fillable areas sear complete on page {page_num} ---')
+def _get_page_fingerprint(fingerprinter, page):
+    """Fingerprint of document page
+    Args:
+        fingerprinter (logic.page_cache.PageFingerprinter|None): None
+            when page cache is disabled
+        page (pdfminer.pdfpage.PDFPage)
+    Returns:
+        str|None: None when page can't be fingerprinted
+    """
+    if fingerprinter is None:
+        return None
+    try:
+        return fingerprinter.fingerprint(page)
+    except Exception:
+        app.logger.exception('PageFingerprintError')
+        return None
 
-        line_areas = fillable_areas['line_areas']
-        checkbox_areas = fillable_areas['checkbox_areas']
 
-        # ToDo: make more accurate check
-        if len(line_areas) == 0 and len(checkbox_areas) == 0:
-            pages.append(doc_page)
-            continue
+def _triage_page(page):
+    """Whether page can have lines or checkboxes, see page_may_have_fields()
+    Args:
+        page (pdfminer.pdfpage.PDFPage)
+    Returns:
+        bool
+    """
+    return not PAGE_TRIAGE or page_may_have_fields(page)
 
-        processed_image_for_tesseract = preprocess_image(cv_image)
-        page_text = pytesseract.image_to_data(
-            processed_image_for_tesseract, output_type=Output.DICT, config='--psm 3', lang='eng'
-        )
+
+def _get_known_page(fingerprint, page_num, detect_lines):
+    """Page result known without rendering: cached or empty text-only page
+    Returns:
+        logic.classes.DocumentPage|None
+    """
+    if not detect_lines and not DETECT_EMPTY_REGIONS:
+        app.logger.info(f'--- CV: page {page_num} has no lines, skipped ---')
+        return DocumentPage(page_num, None)
+    return _get_cached_page(fingerprint, page_num)
+
+
+def _get_cached_page(fingerprint, page_num):
+    if not fingerprint:
+        return None
+    doc_page = page_result_cache.get(fingerprint, page_num)
+    if doc_page is not None:
+        app.logger.info(f'--- CV: page {page_num} taken from page cache ---')
+    return doc_page
+
+
+def _get_detection_cache(pdf_bytes, raster_cache):
+    """Pages for fillable areas detection
+    With CV_DETECTION_DPI below raster_cache resolution (coarse-to-fine
+    mode) pages are detected on separate low resolution renders.
+    Returns:
+        logic.page_raster.PageRasterCache
+    """
+    if CV_DETECTION_DPI >= raster_cache.dpi:
+        return raster_cache
+    return PageRasterCache(pdf_bytes, CV_DETECTION_DPI)
+
+
+def _detect_page(page_num, source, raster_cache, detection_cache, detect_lines=True):
+    """Analyze page vector content or page rendered by detection_cache
+    In coarse-to-fine mode full resolution page is rendered into
+    raster_cache only if OCR needs it. Born-digital pages are rendered
+    only for empty regions.
+    Args:
+        source (logic.pdf_source.PdfSource)
+        detect_lines (bool): False - only empty regions are detected
+    Returns:
+        logic.classes.DocumentPage
+    """
+    geometry = None
+    if detect_lines and VECTOR_DETECTION:
+        geometry = _get_page_geometry(source, page_num)
+    if geometry is not None and not DETECT_EMPTY_REGIONS:
+        return _extract_page_elements_vector(page_num, geometry)
+
+    page_image = detection_cache.get(page_num)
+    if detection_cache is not raster_cache:
+        detection_cache.release(page_num)
+    if geometry is not None:
+        return _extract_page_elements_vector(page_num, geometry, page_image, detection_cache.dpi)
+    return _extract_page_elements_cv(
+        page_num, page_image, detection_cache.dpi, lambda: raster_cache.get(page_num), detect_lines
+    )
+
+
+def _get_page_geometry(source, page_num):
+    """Vector content of born-digital page
+    Returns:
+        logic.page_geometry.PageGeometry|None: None when page has to be
+            rendered
+    """
+    try:
+        return extract_page_geometry(source.pages[page_num], source.resource_manager)
+    except Exception:
+        # e.g. broken content stream, which renderer may still handle
+        return None
+
+
+_worker_source = None
+_worker_raster_cache = None
+_worker_detection_cache = None
+
+
+def _init_cv_worker(pdf_bytes, dpi, detection_dpi):
+    """Keep document in the worker process, so it is sent once per process"""
+    global _worker_source, _worker_raster_cache, _worker_detection_cache
+    _worker_source = PdfSource(pdf_bytes)
+    _worker_raster_cache = PageRasterCache(pdf_bytes, dpi)
+    _worker_detection_cache = _worker_raster_cache
+    if detection_dpi < dpi:
+        _worker_detection_cache = PageRasterCache(pdf_bytes, detection_dpi)
+
+
+def _extract_page_elements_cv_worker(page_num, detect_lines, return_raster):
+    """Process pool task: render and analyze single page
+    Returns:
+        tuple<logic.classes.DocumentPage, numpy.ndarray|None>
+    """
+    doc_page = _detect_page(
+        page_num, _worker_source, _worker_raster_cache, _worker_detection_cache, detect_lines
+    )
+    page_image = _worker_raster_cache.get(page_num) if return_raster else None
+    _worker_raster_cache.release(page_num)
+    return doc_page, page_image
+
+
+def _extract_page_elements_cv(page_num, page_image, dpi=PDF_DOCUMENT_SIZE, render_ocr_image=None,
+                              detect_lines=True):
+    """Find fillable areas on single rendered page
+    Runs in process pool workers too, so it must not use app context.
+    Args:
+       page_num (int): Number of current page in pdf document
+       page_image (numpy.ndarray): Grayscale rendered page
+       dpi (int): Resolution of page_image
+       render_ocr_image (callable|None): Returns page rendered at
+           PDF_DOCUMENT_SIZE, required when dpi is lower
+       detect_lines (bool): False - page is known to have no lines and
+           checkboxes, only empty regions are detected
+    Returns:
+        logic.classes.DocumentPage
+    """
+    doc_page = DocumentPage(page_num, None)
+    # the same gray array is used by all detectors and OCR
+    cv_image = page_image
+
+    # image = Image.fromarray(cv_image)
+    # image.show()
+
+    context = PageImageContext(cv_image, dpi)
+    fillable_areas = find_fillable_areas(
+        context, detect_empty_regions=DETECT_EMPTY_REGIONS, detect_lines=detect_lines
+    )
+
+    # elements coordinates are always at PDF_DOCUMENT_SIZE resolution
+    scale = PDF_DOCUMENT_SIZE / dpi
+    line_areas = fillable_areas['line_areas'].scale(scale)
+    checkbox_areas = fillable_areas['checkbox_areas'].scale(scale)
+    empty_region_areas = fillable_areas['empty_region_areas'].scale(scale)
+
+    # ToDo: make more accurate check
+    if len(line_areas) == 0 and len(checkbox_areas) == 0:
+        _add_empty_region_elements(doc_page, empty_region_areas)
+        return doc_page
+
+    page_words = None
+    # only lines are named by text around them, checkbox-only pages skip OCR
+    if len(line_areas):
+        if dpi != PDF_DOCUMENT_SIZE:
+            cv_image = render_ocr_image()
+            context = PageImageContext(cv_image)
+        processed_image_for_tesseract = preprocess_image(context.gray)
+        page_text = recognize_page_text(processed_image_for_tesseract, line_areas)
+        page_words = WordIndex(page_text)
+    # debug
+    # with open(f'page{page_num}_text.json', 'w') as f:
+    #     json.dump(page_text, f, indent=4)
+
+    _add_area_elements(doc_page, line_areas, checkbox_areas, empty_region_areas, page_words, cv_image)
+    return doc_page
+
+
+def _extract_page_elements_vector(page_num, geometry, page_image=None, dpi=PDF_DOCUMENT_SIZE):
+    """Find fillable areas on single page from its vector content
+    Lines are named by words of the text layer instead of OCR.
+    Runs in process pool workers too, so it must not use app context.
+    Args:
+       page_num (int): Number of current page in pdf document
+       geometry (logic.page_geometry.PageGeometry)
+       page_image (numpy.ndarray|None): Grayscale rendered page for
+           empty regions detection
+       dpi (int): Resolution of page_image
+    Returns:
+        logic.classes.DocumentPage
+    """
+    doc_page = DocumentPage(page_num, None)
+    fillable_areas = find_vector_fillable_areas(
+        geometry.shape, geometry.strokes, geometry.obstacles, PDF_DOCUMENT_SIZE
+    )
+    line_areas = fillable_areas['line_areas']
+    checkbox_areas = fillable_areas['checkbox_areas']
+
+    empty_region_areas = RectArray()
+    if page_image is not None:
+        scale = dpi / PDF_DOCUMENT_SIZE
+        empty_region_areas = find_empty_region_areas(
+            PageImageContext(page_image, dpi), line_areas.scale(scale)
+        ).scale(1 / scale)
+
+    page_words = WordIndex(geometry.words) if len(line_areas) else None
+    _add_area_elements(doc_page, line_areas, checkbox_areas, empty_region_areas, page_words)
+    return doc_page
+
+
+def _add_area_elements(doc_page, line_areas, checkbox_areas, empty_region_areas, page_words, cv_image=None):
+    """Add found areas to page, lines are named by page_words around them"""
+    field_name = None
+    for i, line in enumerate(line_areas):
+        # draw line on image with PIL
         # debug
-        # with open(f'page{page_num}_text.json', 'w') as f:
-        #     json.dump(page_text, f, indent=4)
-
-
-        for i, line in enumerate(line_areas):
-            # draw line on image with PIL
-            # debug
-            # draw = ImageDraw.Draw(image)
-            # draw.rectangle((line.x1, line.y1, line.x2, line.y2), outline=RECTANGLES_OUTLINE_COLOR_1, width=RECTANGLES_OUTLINE_WIDTH)
-            # image.save(f'page{page_num}_line.png')
-
-            field_name = get_field_name(line, page_text, cv_image)  # todo: cv image is just for debug
-
-            obj_type = 'TEXT'
-            if field_name:
-                if field_name == 'signature':
-                    obj_type = 'SIGNATURE'
-                elif field_name == 'date':
-                    obj_type = 'DATE'
-
-            doc_page.add_element(
-                x1=line.x1,
-                y1=line.y1,
-                x2=line.x2,
-                y2=line.y2,
-                obj_type=obj_type,
-                name=field_name,
-                value=None
-            )
-
-        for i, checkbox in enumerate(checkbox_areas):
-            doc_page.add_element(
-                x1=checkbox.x1,
-                y1=checkbox.y1,
-                x2=checkbox.x2,
-                y2=checkbox.y2,
-                obj_type='CHECKBOX',
-                name=field_name,
-                value=None
-            )
-
-        # temporary disabled because of unstable results
-        # for region in fillable_areas['empty_region_areas']:
-        #     doc_page.add_element(
-        #         x1=region.x1,
-        #         y1=region.y1,
-        #         x2=region.x2,
-        #         y2=region.y2,
-        #         obj_type='EMPTY_REGIONS',
-        #         name=None,
-        #         value=None,
-        #     )
+        # draw = ImageDraw.Draw(image)
+        # draw.rectangle((line.x1, line.y1, line.x2, line.y2), outline=RECTANGLES_OUTLINE_COLOR_1, width=RECTANGLES_OUTLINE_WIDTH)
+        # image.save(f'page{page_num}_line.png')
 
-        pages.append(doc_page)
+        field_name = get_field_name(line, page_words, cv_image)  # todo: cv image is just for debug
 
-    return pages
+        obj_type = 'TEXT'
+        if field_name:
+            if field_name == 'signature':
+                obj_type = 'SIGNATURE'
+            elif field_name == 'date':
+                obj_type = 'DATE'
+
+        doc_page.add_element(
+            x1=line.x1,
+            y1=line.y1,
+            x2=line.x2,
+            y2=line.y2,
+            obj_type=obj_type,
+            name=field_name,
+            value=None
+        )
+
+    for i, checkbox in enumerate(checkbox_areas):
+        doc_page.add_element(
+            x1=checkbox.x1,
+            y1=checkbox.y1,
+            x2=checkbox.x2,
+            y2=checkbox.y2,
+            obj_type='CHECKBOX',
+            name=field_name,
+            value=None
+        )
+
+    _add_empty_region_elements(doc_page, empty_region_areas)
+
+
+def _add_empty_region_elements(doc_page, empty_region_areas):
+    for region in empty_region_areas:
+        doc_page.add_element(
+            x1=region.x1,
+            y1=region.y1,
+            x2=region.x2,
+            y2=region.y2,
+            obj_type='EMPTY_REGIONS',
+            name=None,
+            value=None,
+        )
 
 
 def extract_widgets_pdfminer(pdf_binary):
-    parser = PDFParser(pdf_binary)
-    doc = PDFDocument(parser)
+    """Get form widgets of each page
+    Widgets are found through AcroForm /Fields, so only form field
+    objects are resolved. Documents with fields that can't be mapped to
+    pages are read through the page tree and /Annots of every page.
+    Args:
+       pdf_binary (logic.pdf_source.PdfSource|io.BytesIO): PdfSource
+           already parsed by the caller is reused
+    Returns:
+        list<logic.classes.DocumentPage>: Only pages with widgets
+    """
+    source = PdfSource.wrap(pdf_binary)
+    try:
+        pages = _extract_widgets_from_fields(source)
+    except Exception:
+        app.logger.exception('AcroFormFieldsError')
+        pages = None
+    if pages is not None:
+        return pages
+
+    app.logger.info('--- Widgets: page tree fallback ---')
+    return _extract_widgets_from_pages(source)
+
+
+def _extract_widgets_from_fields(source):
+    """Walk AcroForm /Fields tree and group widgets by pages
+    Args:
+        source (logic.pdf_source.PdfSource)
+    Returns:
+        list<logic.classes.DocumentPage>|None: None when document has no
+            fields or some widget has no known /P page
+    """
+    acroform = resolve1(source.document.catalog.get('AcroForm'))
+    fields = resolve1(acroform.get('Fields')) if isinstance(acroform, dict) else None
+    if not fields:
+        return None
+
+    page_index = {page_id: page_num for page_num, page_id in enumerate(source.page_ids)}
+    widgets_by_page = {}
+    for widget in _iter_field_widgets(fields, {}, set()):
+        page_ref = widget.get('P')
+        if not isinstance(page_ref, PDFObjRef) or page_ref.objid not in page_index:
+            return None
+        widgets_by_page.setdefault(page_ref.objid, []).append(widget)
+
+    pages = []
+    for page_id, widgets in sorted(widgets_by_page.items(), key=lambda item: page_index[item[0]]):
+        doc_page = DocumentPage(page_index[page_id], source.get_page_attribute(page_id, 'MediaBox'))
+        for widget in widgets:
+            doc_page.add_element(widget=widget)
+        pages.append(doc_page)
+    return pages
+
+
+def _iter_field_widgets(fields, inherited, visited):
+    """Terminal fields of /Fields tree with inherited attributes
+    Field attributes are set on parent fields in /Kids hierarchies, each
+    widget gets them merged with its own attributes.
+    Args:
+        fields (list): Field references
+        inherited (dict): Attributes of parent fields
+        visited (set): Visited object ids, guards against reference loops
+    Yields:
+        dict: Widget annotation with field attributes
+    """
+    for field_ref in fields:
+        if isinstance(field_ref, PDFObjRef):
+            if field_ref.objid in visited:
+                continue
+            visited.add(field_ref.objid)
+        field = resolve1(field_ref)
+        if not isinstance(field, dict):
+            continue
+
+        kids = resolve1(field.get('Kids'))
+        if kids:
+            yield from _iter_field_widgets(kids, {
+                **inherited,
+                **{key: field[key] for key in INHERITED_FIELD_KEYS if key in field},
+            }, visited)
+        else:
+            yield {**inherited, **field}
+
+
+def _extract_widgets_from_pages(source):
     pages = []
     try:
-        pdf_pages = list(PDFPage.create_pages(doc))
+        pdf_pages = source.pages
     except KeyError as e:
         app.logger.exception('KeyError:', e)
         return pages
@@ -158,11 +529,17 @@ def extract_widgets_pdfminer(pdf_binary):
         page_obj = resolve1(page).attrs
         if 'Annots' not in page_obj.keys():
             continue
+        # links and other annotations don't make the page a form page
+        widgets = [
+            widget for widget in map(resolve1, resolve1(page_obj['Annots']) or [])
+            if isinstance(widget, dict) and getattr(widget.get('Subtype'), 'name', None) == 'Widget'
+        ]
+        if not widgets:
+            continue
         media_box = page_obj['MediaBox']
-        widgets = resolve1(page_obj['Annots'])
         doc_page = DocumentPage(page_number, media_box)
         for widget in widgets:
-            doc_page.add_element(widget=resolve1(widget))
+            doc_page.add_element(widget=widget)
         pages.append(doc_page)
 
     return pages
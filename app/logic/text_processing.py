@@ -1,7 +1,15 @@
 import re
+from collections import defaultdict
 
 import cv2
+import pytesseract
 from PIL import Image, ImageDraw
+from pytesseract import Output
+
+from app.logic.constants import OCR_MODE, OCR_REGION_MAX_GROWTH, OCR_REGION_PADDING
+
+OCR_DATA_KEYS = ('text', 'left', 'top', 'width', 'height', 'conf')
+WORD_INDEX_CELL_SIZE = 100
 
 
 def get_field_name_from_the_sides(box_related_words: dict):
@@ -49,50 +57,101 @@ def clean_word(word):
     return re.sub(r"[^a-zA-Z]", "", word).lower()
 
 
-def word_near_box_side(word_coords, extended_coords):
-    # Check if the word is in any of the extended areas
-    for side, coords in extended_coords.items():
-        if (
-            coords[0] <= word_coords[0] <= coords[2]
-            and coords[1] <= word_coords[1] <= coords[3]
-        ):
-            return side  # The word is in this extended area
+class WordIndex:
+    """Grid index of page words by their top-left corner
+    Words are validated and cleaned once per page, so each field
+    lookup only touches grid cells inside its extended areas.
+    Attributes:
+        _words (list<str>): Cleaned valid words in OCR order
+        _coords (list<tuple>): (left, top) of each word
+        _cells (dict): Word indexes by (column, row) grid cell
+        _cell_size (int): Grid cell side in pixels
+    """
+    def __init__(self, ocr_data, cell_size=WORD_INDEX_CELL_SIZE):
+        """
+        Attributes:
+            ocr_data (dict): pytesseract.image_to_data output
+            cell_size (int): Grid cell side in pixels
+        """
+        self._words = []
+        self._coords = []
+        self._cells = defaultdict(list)
+        self._cell_size = cell_size
+        for i, word in enumerate(ocr_data['text']):
+            if not is_valid_text(word):
+                continue
+            left, top = ocr_data['left'][i], ocr_data['top'][i]
+            self._cells[(left // cell_size, top // cell_size)].append(len(self._words))
+            self._words.append(clean_word(word))
+            self._coords.append((left, top))
+
+    def __len__(self):
+        return len(self._words)
+
+    def word(self, index):
+        """Get cleaned word
+        Args:
+            index (int): Index returned by query
+        Returns:
+            str
+        """
+        return self._words[index]
 
-    return None  # The word is not in any of the extended areas
+    def query(self, area):
+        """Find words which top-left corner is inside area (borders included)
+        Args:
+            area (tuple): (x1, y1, x2, y2)
+        Returns:
+            list<int>: Word indexes in OCR order
+        """
+        x1, y1, x2, y2 = area
+        found = []
+        for column in range(int(x1) // self._cell_size, int(x2) // self._cell_size + 1):
+            for row in range(int(y1) // self._cell_size, int(y2) // self._cell_size + 1):
+                for index in self._cells.get((column, row), ()):
+                    left, top = self._coords[index]
+                    if x1 <= left <= x2 and y1 <= top <= y2:
+                        found.append(index)
+        return sorted(found)
 
 
-def get_box_related_words(ocr_data, extended_box_coords) -> dict:
+def get_box_related_words(word_index, extended_box_coords) -> dict:
     box_related_words = {
         "top": [],
         "bottom": [],
         "left": [],
         "right": [],
     }
-    for i in range(len(ocr_data['text'])):
-        word = ocr_data['text'][i]
-        if not is_valid_text(word):
-            continue
-        word_coords = (ocr_data['left'][i], ocr_data['top'][i])
-        position = word_near_box_side(word_coords, extended_box_coords)
-        if position:
-            box_related_words[position].append(clean_word(ocr_data['text'][i]))
+    # The word belongs to the first extended area it is in
+    word_sides = {}
+    for side, coords in extended_box_coords.items():
+        for index in word_index.query(coords):
+            word_sides.setdefault(index, side)
+
+    for index in sorted(word_sides):
+        box_related_words[word_sides[index]].append(word_index.word(index))
 
     return box_related_words
 
 
-def get_field_name(field, page_text, debug_image):
+def get_extended_areas(field):
+    # Areas around the field where its label is looked for
     w, h = field.x2-field.x1, field.y2-field.y1
-    # debug
-    # draw_image = Image.fromarray(debug_image)
-    # draw = ImageDraw.Draw(draw_image)
-    # draw.rectangle((x, y, x+w, y+h), outline='red', width=10)
-    extended_areas = {
+    return {
         "left": (field.x1 - w, field.y1, field.x1, field.y2),
         "right": (field.x2, field.y1, field.x2 + w, field.y2),
         "top": (field.x1, field.y1 - h, field.x2, field.y1),
         "bottom": (field.x1, field.y2, field.x2, field.y2 + h),
     }
-    box_related_words = get_box_related_words(page_text, extended_areas)
+
+
+def get_field_name(field, page_words, debug_image):
+    # debug
+    # draw_image = Image.fromarray(debug_image)
+    # draw = ImageDraw.Draw(draw_image)
+    # draw.rectangle((x, y, x+w, y+h), outline='red', width=10)
+    extended_areas = get_extended_areas(field)
+    box_related_words = get_box_related_words(page_words, extended_areas)
     cleaned_field_name = get_field_name_from_the_sides(box_related_words)
     # debug
     # _debug_draw_boxes((field.x1, field.y1, field.x2, field.y2), extended_areas, debug_image)
@@ -110,8 +169,8 @@ def _debug_draw_boxes(box_coords, extended_box_coords, image):
     return
 
 
-def preprocess_image(page_image):
-    gray = cv2.cvtColor(page_image, cv2.COLOR_BGR2GRAY)
+def preprocess_image(gray):
+    # gray is shared with fillable areas detection (PageImageContext.gray)
     thresh = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY_INV)[1]
 
     result = cv2.GaussianBlur(thresh, (5, 5), 0)
@@ -122,3 +181,124 @@ def preprocess_image(page_image):
     return result
 
 
+def recognize_page_text(processed_image, fields, mode=OCR_MODE):
+    """Run Tesseract on the page
+    Args:
+        processed_image (numpy.ndarray): Result of preprocess_image
+        fields (shapes.RectArray): Fields which labels are needed
+        mode (str): 'page' - whole page, 'regions' - only merged
+            extended areas of the fields, with sparse text segmentation
+    Returns:
+        dict: pytesseract.image_to_data output in page coordinates
+    """
+    if mode != 'regions':
+        return pytesseract.image_to_data(
+            processed_image, output_type=Output.DICT, config='--psm 3', lang='eng'
+        )
+
+    image_height, image_width = processed_image.shape[:2]
+    areas = [
+        area for field in fields for area in get_extended_areas(field).values()
+    ]
+    page_text = {key: [] for key in OCR_DATA_KEYS}
+    # word boxes of already read regions, by region
+    read_regions = []
+    for x1, y1, x2, y2 in merge_areas(areas, OCR_REGION_PADDING):
+        x1, y1 = max(x1, 0), max(y1, 0)
+        x2, y2 = min(x2, image_width), min(y2, image_height)
+        if x2 <= x1 or y2 <= y1:
+            continue
+        region_text = pytesseract.image_to_data(
+            processed_image[y1:y2, x1:x2], output_type=Output.DICT, config='--psm 11', lang='eng'
+        )
+        # regions may overlap, words in the overlap are read twice,
+        # only words of overlapping regions can be the same
+        region = (x1, y1, x2 - x1, y2 - y1)
+        overlapping_boxes = [
+            other for other_region, boxes in read_regions
+            if _intersects(region, other_region) for other in boxes
+        ]
+        region_boxes = []
+        read_regions.append((region, region_boxes))
+        for i in range(len(region_text['text'])):
+            # shift word coordinates from region to page
+            box = (
+                region_text['left'][i] + x1, region_text['top'][i] + y1,
+                region_text['width'][i], region_text['height'][i],
+            )
+            if region_text['text'][i].strip():
+                if any(_is_same_word(box, other) for other in overlapping_boxes):
+                    continue
+                region_boxes.append(box)
+            for key, value in zip(OCR_DATA_KEYS, (region_text['text'][i], *box, region_text['conf'][i])):
+                page_text[key].append(value)
+    return page_text
+
+
+def _intersects(box, other):
+    """Whether boxes (left, top, width, height) have common area"""
+    return (
+        box[0] < other[0] + other[2] and other[0] < box[0] + box[2]
+        and box[1] < other[1] + other[3] and other[1] < box[1] + box[3]
+    )
+
+
+def _is_same_word(box, other):
+    """Whether word boxes (left, top, width, height) overlap by more than
+    half of the smaller one
+    """
+    width = min(box[0] + box[2], other[0] + other[2]) - max(box[0], other[0])
+    height = min(box[1] + box[3], other[1] + other[3]) - max(box[1], other[1])
+    if width <= 0 or height <= 0:
+        return False
+    return width * height * 2 > min(box[2] * box[3], other[2] * other[3])
+
+
+def merge_areas(areas, padding=0, max_growth=OCR_REGION_MAX_GROWTH):
+    """Merge overlapping areas into their bounding boxes
+    Areas are merged only while the bounding box stays within max_growth
+    of the size covered by merged areas, so a chain of overlapping areas
+    doesn't grow into one region covering the page.
+    Args:
+        areas (list<tuple>): (x1, y1, x2, y2) areas
+        padding (int): Grow each area by this value before merging
+        max_growth (float): Max ratio of bounding box size to covered size
+    Returns:
+        list<tuple>: Areas covering all input areas, overlapping ones
+            stay separate when their bounding box is too large
+    """
+    # area with size of the areas merged into it
+    merged = []
+    for x1, y1, x2, y2 in areas:
+        x1, y1, x2, y2 = x1 - padding, y1 - padding, x2 + padding, y2 + padding
+        merged.append(((x1, y1, x2, y2), (x2 - x1) * (y2 - y1)))
+    changed = True
+    while changed:
+        changed = False
+        result = []
+        for area, size in sorted(merged):
+            for i, (other, other_size) in enumerate(result):
+                if not (
+                    area[0] <= other[2] and other[0] <= area[2]
+                    and area[1] <= other[3] and other[1] <= area[3]
+                ):
+                    continue
+                bounding_box = (
+                    min(area[0], other[0]), min(area[1], other[1]),
+                    max(area[2], other[2]), max(area[3], other[3]),
+                )
+                # lower bound of the merged size, overlap is counted once
+                overlap_size = (
+                    (min(area[2], other[2]) - max(area[0], other[0]))
+                    * (min(area[3], other[3]) - max(area[1], other[1]))
+                )
+                merged_size = max(size + other_size - overlap_size, size, other_size)
+                bounding_size = (bounding_box[2] - bounding_box[0]) * (bounding_box[3] - bounding_box[1])
+                if bounding_size <= merged_size * max_growth:
+                    result[i] = (bounding_box, merged_size)
+                    changed = True
+                    break
+            else:
+                result.append((area, size))
+        merged = result
+    return [area for area, _ in merged]
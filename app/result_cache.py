@@ -0,0 +1,168 @@
+"""Content-addressed cache of detection results"""
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import threading
+
+from app.helpers import write_atomic
+from app.logic.constants import (
+    CV_DETECTION_DPI,
+    DETECT_EMPTY_REGIONS,
+    HYBRID_DETECTION,
+    OCR_MODE,
+    PAGE_TRIAGE,
+    PDF_DOCUMENT_SIZE,
+    RESULT_CACHE_DIR,
+    RESULT_CACHE_MAX_BYTES,
+    RESULT_CACHE_SIZE,
+    RESULT_CACHE_VERSION,
+    VECTOR_DETECTION,
+)
+
+# Everything besides document bytes that changes detection result
+DETECTION_CONFIG = json.dumps({
+    'version': RESULT_CACHE_VERSION,
+    'dpi': PDF_DOCUMENT_SIZE,
+    'detection_dpi': CV_DETECTION_DPI,
+    'ocr_mode': OCR_MODE,
+    'empty_regions': DETECT_EMPTY_REGIONS,
+    'hybrid': HYBRID_DETECTION,
+    'page_triage': PAGE_TRIAGE,
+    'vector': VECTOR_DETECTION,
+}, sort_keys=True)
+# Eviction frees the on-disk tier down to this part of max_bytes, so the
+# directory is scanned again only after more results are written
+EVICTION_LOW_WATERMARK = 0.9
+
+
+def result_cache_key(binary_file):
+    """
+    Args:
+        binary_file (bytes): Pdf document
+    Returns:
+        str: sha256 of document and detection config
+    """
+    digest = hashlib.sha256(binary_file)
+    digest.update(DETECTION_CONFIG.encode())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Two-tier storage of detect() response bodies
+    In-memory LRU is local to the process, on-disk tier is shared by all
+    app and job processes on the host.
+    Attributes:
+        memory_size (int): Max number of results in memory, 0 - disabled
+        path (str): On-disk tier directory
+        max_bytes (int): Max on-disk tier size, 0 - disabled
+    """
+    def __init__(self, memory_size=RESULT_CACHE_SIZE, path=RESULT_CACHE_DIR, max_bytes=RESULT_CACHE_MAX_BYTES):
+        """
+        Attributes:
+            memory_size (int): Max number of results in memory, 0 - disabled
+            path (str): On-disk tier directory
+            max_bytes (int): Max on-disk tier size, 0 - disabled
+        """
+        self.memory_size = memory_size
+        self.path = path
+        self.max_bytes = max_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        # on-disk tier size seen by last scan plus results written since,
+        # None - not scanned yet
+        self._disk_size = None
+
+    def get(self, key):
+        """
+        Args:
+            key (str): result_cache_key()
+        Returns:
+            str|None: Cached response body
+        """
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+
+        body = self._read(key)
+        if body is not None:
+            self._remember(key, body)
+        return body
+
+    def put(self, key, body):
+        """
+        Args:
+            key (str): result_cache_key()
+            body (str): detect() response body
+        """
+        self._remember(key, body)
+        self._write(key, body)
+
+    def _remember(self, key, body):
+        if not self.memory_size:
+            return
+        with self._lock:
+            self._memory[key] = body
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    def _read(self, key):
+        if not self.max_bytes:
+            return None
+        path = os.path.join(self.path, f'{key}.json')
+        try:
+            with open(path) as f:
+                body = f.read()
+            # mtime is the last use, see _evict
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return body
+
+    def _write(self, key, body):
+        if not self.max_bytes:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        write_atomic(os.path.join(self.path, f'{key}.json'), body)
+        with self._lock:
+            if self._disk_size is not None:
+                self._disk_size += len(body.encode())
+            scan = self._disk_size is None or self._disk_size > self.max_bytes
+        if scan:
+            self._evict()
+
+    def _evict(self):
+        """Delete least recently used results until tier fits max_bytes
+        Other processes write to the same tier, so the directory is
+        scanned whenever own estimate of its size exceeds max_bytes.
+        """
+        entries = []
+        total_size = 0
+        for entry in os.scandir(self.path):
+            if entry.name.startswith('.'):
+                # being written
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                # evicted by other process
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total_size += stat.st_size
+
+        if total_size > self.max_bytes:
+            for _, size, path in sorted(entries):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total_size -= size
+                if total_size <= self.max_bytes * EVICTION_LOW_WATERMARK:
+                    break
+        with self._lock:
+            self._disk_size = total_size
+
+
+result_cache = ResultCache()
@@ -1,7 +1,15 @@
 """App's entrypoint"""
 import os
 from app.init import app
-from app.api import detect
+from app.api import (
+    debug_image,
+    debug_status,
+    detect,
+    detect_batch,
+    detection_job_result,
+    detection_job_status,
+    submit_detection_job,
+)
 
 
 @app.route('/api/v1/detect', methods=['POST'])
@@ -9,5 +17,35 @@ def some_detection():
     return detect()
 
 
+@app.route('/api/v1/debug/<debug_id>', methods=['GET'])
+def some_debug_status(debug_id):
+    return debug_status(debug_id)
+
+
+@app.route('/api/v1/debug/<debug_id>/<int:page_num>', methods=['GET'])
+def some_debug_image(debug_id, page_num):
+    return debug_image(debug_id, page_num)
+
+
+@app.route('/api/v1/detect/batch', methods=['POST'])
+def some_batch_detection():
+    return detect_batch()
+
+
+@app.route('/api/v1/jobs', methods=['POST'])
+def some_job_submission():
+    return submit_detection_job()
+
+
+@app.route('/api/v1/jobs/<job_id>', methods=['GET'])
+def some_job_status(job_id):
+    return detection_job_status(job_id)
+
+
+@app.route('/api/v1/jobs/<job_id>/result', methods=['GET'])
+def some_job_result(job_id):
+    return detection_job_result(job_id)
+
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=int(os.environ.get('PORT', 4999)))
@@ -0,0 +1,117 @@
+"""Vectorized empty areas against the previous per-cell loops."""
+
+import copy
+
+import cv2
+import numpy as np
+
+from app.logic.fillable_areas.empty_areas import (
+    _find_fillable_areas_within_contour,
+    merge_found_rectangles,
+)
+from app.logic.fillable_areas.geometry.shapes import Rectangle
+
+EDGE = 24
+OUTER_FIELD_WIDTH = 150
+FILLABLE_AREA_LIMITS = {'min_height': EDGE}
+
+
+def _find_fillable_areas_within_contour_loop(gray_image, x1, y1, x2, y2, edge, outer_field_width):
+    """Previous cell by cell split of the contour."""
+    image_height, image_width = gray_image.shape[:2]
+    rectangles = []
+    for y in range(y1, y2, edge):
+        current_rectangle = None
+        for x in range(x1, x2, edge):
+            if x + edge > image_width - outer_field_width:
+                continue
+            current_cell_fillable = np.amin(gray_image[y:y + edge, x:x + edge]) != 0
+            if current_cell_fillable:
+                if not current_rectangle:
+                    current_rectangle = Rectangle(x, y, x + edge, y + edge)
+                else:
+                    current_rectangle.x2 = x + edge
+                    current_rectangle.y2 = y + edge
+            else:
+                if current_rectangle:
+                    rectangles.append(current_rectangle)
+                    current_rectangle = None
+            cv2.rectangle(gray_image, (x, y), (x + edge - 1, y + edge - 1), 0, -1)
+        if current_rectangle:
+            rectangles.append(current_rectangle)
+    return rectangles
+
+
+def _merge_found_rectangles_loop(found_rectangles, step):
+    """Previous dict probing merge of rectangles below each other."""
+    sorted_rectangles = {
+        r.coordinates: r
+        for r in sorted(found_rectangles, key=lambda r: (r.y1, r.x1))
+    }
+    processed_rectangles = set()
+    merged_rectangles = []
+    for rectangle in sorted_rectangles.values():
+        if rectangle not in processed_rectangles:
+            processed_rectangles.add(rectangle)
+            r = copy.copy(rectangle)
+            i = 1
+            while new_rectangle := sorted_rectangles.get(
+                    (rectangle.x1, rectangle.y1 + step * i,
+                     rectangle.x2, rectangle.y2 + step * i)):
+                r.y2 = new_rectangle.y2
+                processed_rectangles.add(new_rectangle)
+                i += 1
+            merged_rectangles.append(r.coordinates)
+    return merged_rectangles
+
+
+def _random_page(seed, width=1200, height=1600):
+    """Gray page with text blobs and overlapping contour bounding boxes."""
+    rng = np.random.default_rng(seed)
+    image = np.full((height, width), 255, dtype=np.uint8)
+    for _ in range(40):
+        x, y = int(rng.integers(0, width)), int(rng.integers(0, height))
+        image[y:y + int(rng.integers(2, 60)), x:x + int(rng.integers(2, 200))] = 0
+    contours = []
+    for _ in range(8):
+        x1, y1 = int(rng.integers(0, width - 50)), int(rng.integers(0, height - 50))
+        contours.append((
+            x1, y1,
+            x1 + int(rng.integers(30, width - x1)), y1 + int(rng.integers(30, height - y1)),
+        ))
+    return image, contours
+
+
+def test_find_fillable_areas_within_contour_matches_loop():
+    for seed in range(5):
+        image, contours = _random_page(seed)
+        loop_image = image.copy()
+        for x1, y1, x2, y2 in contours:
+            expected = _find_fillable_areas_within_contour_loop(
+                loop_image, x1, y1, x2, y2, EDGE, OUTER_FIELD_WIDTH)
+            found = _find_fillable_areas_within_contour(
+                image, x1, y1, x2, y2, EDGE, OUTER_FIELD_WIDTH)
+            assert found.tolist() == [list(r.coordinates) for r in expected]
+        # processed cells are painted the same way
+        assert np.array_equal(image, loop_image)
+
+
+def test_merge_found_rectangles_matches_loop():
+    for seed in range(5):
+        image, contours = _random_page(seed)
+        found = [
+            _find_fillable_areas_within_contour_loop(
+                image, x1, y1, x2, y2, EDGE, OUTER_FIELD_WIDTH)
+            for x1, y1, x2, y2 in contours
+        ]
+        rectangles = [r for contour_rectangles in found for r in contour_rectangles]
+        expected = _merge_found_rectangles_loop(rectangles, EDGE)
+        merged = merge_found_rectangles(
+            np.array([r.coordinates for r in rectangles], dtype=np.int64).reshape(-1, 4),
+            FILLABLE_AREA_LIMITS)
+        assert merged.boxes.tolist() == [list(r) for r in expected]
+
+
+def test_merge_found_rectangles_empty():
+    merged = merge_found_rectangles(np.empty((0, 4), dtype=np.int64), FILLABLE_AREA_LIMITS)
+    assert not len(merged)
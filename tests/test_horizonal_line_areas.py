@@ -0,0 +1,144 @@
+"""Vectorized line areas against the previous per-line loops."""
+
+import itertools
+
+import numpy as np
+
+from app.logic.fillable_areas.geometry.shapes import RectArray, Rectangle
+from app.logic.fillable_areas.horizonal_line_areas import (
+    _find_fillable_line_areas,
+    split_lines_by_table_grid,
+)
+
+TABLE_CELL_MIN_WIDTH = 40
+TOLERANCE = 5
+MARGIN = 5
+FILLABLE_AREA_LIMITS = {'min_height': 24, 'max_height': 28}
+
+
+def _find_intersection(l1, l2):
+    """Intersection of two lines, as computed before RectArray."""
+    x = (
+        ((l1.x1 * l1.y2 - l1.y1 * l1.x2) * (l2.x1 - l2.x2)
+         - (l1.x1 - l1.x2) * (l2.x1 * l2.y2 - l2.y1 * l2.x2))
+        / ((l1.x1 - l1.x2) * (l2.y1 - l2.y2) - (l1.y1 - l1.y2) * (l2.x1 - l2.x2))
+    )
+    y = (
+        ((l1.x1 * l1.y2 - l1.y1 * l1.x2) * (l2.y1 - l2.y2)
+         - (l1.y1 - l1.y2) * (l2.x1 * l2.y2 - l2.y1 * l2.x2))
+        / ((l1.x1 - l1.x2) * (l2.y1 - l2.y2) - (l1.y1 - l1.y2) * (l2.x1 - l2.x2))
+    )
+    return int(x), int(y)
+
+
+def _split_lines_loop(horizontal_lines, vertical_lines, table_cell_min_width, tolerance):
+    """Previous line by line split of find_line_fillable_areas."""
+    lines = []
+    for hl in horizontal_lines:
+        split_points = []
+        for vl in vertical_lines:
+            x, y = _find_intersection(hl, vl)
+            if hl.x1 - tolerance <= x <= hl.x2 + tolerance and vl.y1 - tolerance <= y <= vl.y2 + tolerance:
+                split_points.append((x, y))
+        if split_points:
+            all_points = sorted(set([hl.x1, hl.x2] + [x for x, y in split_points]))
+            a, b = itertools.tee(all_points)
+            next(b, None)
+            for x_start, x_end in zip(a, b):
+                if x_end - x_start >= table_cell_min_width:
+                    lines.append((x_start, hl.y1, x_end, hl.y2))
+        else:
+            lines.append(hl.coordinates)
+    return lines
+
+
+def _find_fillable_line_area_loop(image, line, fillable_area_limits, tables_upper_borders, margin):
+    """Previous pixel by pixel growth of the area above one line."""
+    min_height = fillable_area_limits['min_height']
+    max_height = fillable_area_limits['max_height']
+    for table_upper_border in tables_upper_borders:
+        if table_upper_border[1] == line.y1 and line.x2 - line.x1 <= table_upper_border[2] - table_upper_border[0]:
+            return None
+    all_min_area = image[line.y1 - min_height:line.y1, line.x1 + margin:line.x2 - margin]
+    if not (all_min_area.shape[0] and all_min_area.shape[1] and np.amax(all_min_area) == 0):
+        return None
+    for i in range(1, max_height - min_height + 1):
+        current_area = image[line.y1 - min_height - i:line.y1, line.x1 + margin:line.x2 - margin]
+        if not (current_area.shape[0] and current_area.shape[1] and np.amax(current_area) == 0):
+            return line.x1 + margin, line.y1 - min_height - i + 1, line.x2 - margin, line.y1
+    return line.x1 + margin, line.y1 - max_height, line.x2 - margin, line.y1
+
+
+def _random_lines_page(seed, width=1200, height=1600):
+    """Binary page with lines and text blobs at various heights above them."""
+    rng = np.random.default_rng(seed)
+    image = np.zeros((height, width), dtype=np.uint8)
+    lines = []
+    for _ in range(80):
+        x1, y = int(rng.integers(0, width - 20)), int(rng.integers(0, height))
+        x2 = x1 + int(rng.integers(2 * MARGIN + 1, width - x1))
+        lines.append((x1, y, x2, y))
+        image[y, x1:x2] = 255
+        if rng.random() < 0.7:
+            # blob above part of the line, up to a bit higher than max height
+            bx = int(rng.integers(x1, x2))
+            by = y - int(rng.integers(1, 40))
+            image[max(by - 5, 0):max(by, 0) + 1, bx:bx + int(rng.integers(1, 30))] = 255
+    return image, RectArray(lines)
+
+
+def _random_grid(seed, width=1200, height=1600):
+    """Horizontal and vertical lines like the ones found on a table page."""
+    rng = np.random.default_rng(seed)
+    horizontal = []
+    for _ in range(60):
+        x1, y = int(rng.integers(0, width - 20)), int(rng.integers(0, height))
+        horizontal.append((x1, y, x1 + int(rng.integers(10, width - x1)), y))
+    vertical = []
+    for _ in range(25):
+        x, y1 = int(rng.integers(0, width)), int(rng.integers(0, height - 20))
+        vertical.append((x, y1, x, y1 + int(rng.integers(10, height - y1))))
+    return np.array(horizontal, dtype=np.int64), np.array(vertical, dtype=np.int64)
+
+
+def test_split_lines_by_table_grid_matches_loop():
+    for seed in range(5):
+        horizontal, vertical = _random_grid(seed)
+        expected = _split_lines_loop(
+            RectArray(horizontal), RectArray(vertical), TABLE_CELL_MIN_WIDTH, TOLERANCE)
+        lines = split_lines_by_table_grid(horizontal, vertical, TABLE_CELL_MIN_WIDTH, TOLERANCE)
+        assert lines.boxes.tolist() == [list(line) for line in expected]
+
+
+def test_split_lines_without_vertical_lines():
+    horizontal, _ = _random_grid(0)
+    lines = split_lines_by_table_grid(
+        horizontal, np.empty((0, 4), dtype=np.int64), TABLE_CELL_MIN_WIDTH, TOLERANCE)
+    assert lines.boxes.tolist() == horizontal.tolist()
+
+
+def test_rect_array_matches_rectangles():
+    boxes = [(10, 20, 110, 40), (0, 0, 5, 5), (50, 10, 60, 300)]
+    rectangles = RectArray(boxes)
+    assert [r.coordinates for r in rectangles] == boxes
+    assert isinstance(rectangles[1], Rectangle)
+    assert rectangles[1].coordinates == boxes[1]
+    assert rectangles.intersection((8, 15, 55, 35)).boxes.tolist() == [
+        [10, 20, 55, 35], [50, 15, 55, 35],
+    ]
+    assert RectArray.concatenate([rectangles[:1], RectArray()]).boxes.tolist() == [list(boxes[0])]
+
+
+def test_find_fillable_line_areas_matches_loop():
+    for seed in range(5):
+        image, lines = _random_lines_page(seed)
+        # upper border of a table on one of the lines
+        tables_upper_borders = [(0, lines[0].y1, image.shape[1], lines[0].y1)]
+        expected = [
+            area for line in lines
+            if (area := _find_fillable_line_area_loop(
+                image, line, FILLABLE_AREA_LIMITS, tables_upper_borders, MARGIN))
+        ]
+        areas = _find_fillable_line_areas(
+            image, lines, FILLABLE_AREA_LIMITS, tables_upper_borders, MARGIN)
+        assert areas.boxes.tolist() == [list(area) for area in expected]